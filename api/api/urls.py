@@ -1,13 +1,15 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.auth.views_auth import ProfileTokenObtainPairView
+
 urlpatterns = [
     path('api/', include('core.urls')),
     path('admin/', admin.site.urls),
-    path('api/token/', TokenObtainPairView.as_view(), name="token"),
+    path('api/token/', ProfileTokenObtainPairView.as_view(), name="token"),
     # path('api/auth/', include('rest_auth.urls')),
     path('api/refresh_token/', TokenRefreshView.as_view(), name="refresh_token"),
     path('ckeditor/', include('ckeditor_uploader.urls')),
@@ -7,10 +7,12 @@ from .profile.models_profile import Profile, Subscription
 from .course.models_course import CourseStatus, Course, CourseInfo, CourseMainInfo, CourseFit, CourseStars, CourseSkill, \
     Theme, Lesson, Step, \
     ProfileCourseStatus, ProfileCourse, ProfileTheme, ProfileLesson, ProfileStepStatus, ProfileStep, \
-    ProfileCourseRole, CreatorCollection, ProfileCourseCollection, ProfileActionsLogs
+    ProfileCourseRole, CreatorCollection, ProfileCourseCollection, ProfileActionsLogs, CourseCatalogEntry
 
 from .collection.models_collection import Collection, ProfileCollection, CollectionStars
 
+from .search.models_search import SearchTerm
+
 # Register your models here.
 
 # PROFILE
@@ -22,6 +24,7 @@ admin.site.register(Subscription)
 admin.site.register(CourseStatus)
 admin.site.register(CreatorCollection)
 admin.site.register(Course)
+admin.site.register(CourseCatalogEntry)
 
 # Page COURSE
 admin.site.register(CourseInfo)
@@ -50,3 +53,6 @@ admin.site.register(ProfileStep)
 admin.site.register(Collection)
 admin.site.register(ProfileCollection)
 admin.site.register(CollectionStars)
+
+# SEARCH
+admin.site.register(SearchTerm)
@@ -0,0 +1,50 @@
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import NotAuthenticated
+
+from ..profile.models_profile import Profile
+
+
+class ProfileMiddleware:
+    """
+    request.profile - профиль авторизованного пользователя (вместе с user), загружается один раз за запрос
+    и только при обращении: DRF проставляет request.user уже после middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: ProfileMiddleware.get_profile(request))
+        return self.get_response(request)
+
+    @staticmethod
+    def get_claim_profile_id(request):
+        """profile_id из JWT токена (см. ProfileTokenObtainPairSerializer)"""
+        token = getattr(request, 'auth', None)
+        if not hasattr(token, 'get'):
+            return None
+        return token.get('profile_id', None)
+
+    @staticmethod
+    def get_profile(request):
+        if not hasattr(request, '_cached_profile'):
+            user = getattr(request, 'user', None)
+            if (user is None) or (not user.is_authenticated):
+                raise NotAuthenticated()
+            queryset = Profile.objects.select_related('user').filter(user=user)
+            profile_id = ProfileMiddleware.get_claim_profile_id(request)
+            if profile_id is not None:
+                queryset = queryset.filter(pk=profile_id)
+            profile = queryset.first()
+            if profile is None:
+                raise NotAuthenticated()
+            request._cached_profile = profile
+        return request._cached_profile
+
+    @staticmethod
+    def get_profile_id(request):
+        """id профиля без запроса к базе, если он есть в токене; иначе из request.profile"""
+        profile_id = ProfileMiddleware.get_claim_profile_id(request)
+        if profile_id is not None:
+            return profile_id
+        return request.profile.pk
@@ -7,6 +7,7 @@ from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from ..profile.models_profile import Profile
 
@@ -24,6 +25,16 @@ class LoginSerializer(serializers.ModelSerializer):
         return Profile.objects.get(user=user).path
 
 
+class ProfileTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Пара токенов с claim profile_id, чтобы не искать профиль по user на каждом запросе"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['profile_id'] = Profile.objects.filter(user=user).values_list('pk', flat=True).first()
+        return token
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(max_length=128, min_length=8, write_only=True)
 
@@ -8,9 +8,10 @@ from django.utils.encoding import smart_str, smart_bytes, DjangoUnicodeDecodeErr
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from rest_framework import permissions, generics, status
 from rest_framework.response import Response
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from .serializers_auth import RegisterSerializer, RequestPasswordResetEmailSerializer, SetNewPasswordSerializer, \
-    LoginSerializer
+    LoginSerializer, ProfileTokenObtainPairSerializer
 from ..profile.models_profile import Profile
 from ..profile.serializers_profile import UserSerializer
 from ..utils import Util
@@ -27,15 +28,24 @@ class LoginView(generics.GenericAPIView):
 
         if user:
             serializer = self.serializer_class(user)
+            # token - прежний токен User.token для существующих клиентов,
+            # access/refresh - та же пара с claim profile_id, что и у /api/token/
+            token = ProfileTokenObtainPairSerializer.get_token(user)
             return Response({
                 'path': serializer.data.get('path'),
                 'username': serializer.data.get('username'),
                 'email': serializer.data.get('email'),
-                'access': serializer.data.get('token'),
+                'token': serializer.data.get('token'),
+                'access': str(token.access_token),
+                'refresh': str(token),
             }, status=status.HTTP_200_OK)
         return Response({'error': "Не правильная почта или пароль"}, status=status.HTTP_401_UNAUTHORIZED)
 
 
+class ProfileTokenObtainPairView(TokenObtainPairView):
+    serializer_class = ProfileTokenObtainPairSerializer
+
+
 # Create your views here.
 class RegisterView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
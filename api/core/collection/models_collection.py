@@ -2,15 +2,17 @@ import datetime
 
 from django.core.validators import validate_image_file_extension
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
+from ..helpers.counter import TableCounter, LinkCounter
+from ..helpers.model import CounterModel
 from ..profile.models_profile import Profile
 from ..utils import Util
 
 # ########### COLLECTION START ##############
 
 
-class Collection(models.Model):
+class Collection(CounterModel):
     """Collection"""
     title = models.CharField(max_length=64)
     description = models.TextField(max_length=512, blank=True)
@@ -23,6 +25,8 @@ class Collection(models.Model):
     date_create = models.DateField(default=datetime.date.today)
     path = models.CharField(max_length=64, blank=True, unique=True)
 
+    counter_fields = ('members_amount',)
+
     def __str__(self):
         return f'{self.profile.user.username}: {self.title}  [Collection]'
 
@@ -34,8 +38,7 @@ def create_collection(sender, **kwargs):
         collection.path = collection.pk
         collection.save()
 
-        profile_collection = ProfileCollection.objects.create(collection=collection, profile=collection.profile)
-        profile_collection.save()
+        CollectionMembers.add(collection=collection, profile=collection.profile)
 
         collection_stars = CollectionStars.objects.create(collection=collection)
         collection_stars.save()
@@ -43,6 +46,10 @@ def create_collection(sender, **kwargs):
 
 post_save.connect(create_collection, sender=Collection)
 
+collection_counter = TableCounter(Collection)
+post_save.connect(collection_counter.increment, sender=Collection)
+post_delete.connect(collection_counter.decrement, sender=Collection)
+
 
 class ProfileCollection(models.Model):
     """ProfileCollection"""
@@ -51,10 +58,38 @@ class ProfileCollection(models.Model):
     grade = models.IntegerField(blank=True, null=True)
     date_added = models.DateField(default=datetime.date.today, blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'collection'], name='unique_profile_collection'),
+        ]
+
     def __str__(self):
         return f"\"{self.profile.user.username}\" to \"{self.collection.title}\" [Profile to Collection]"
 
 
+class CollectionMembers:
+    """
+    Collection.members_amount - сколько профилей добавили подборку, автор считается с момента создания.
+    Строки ProfileCollection пропадают мимо remove при удалении профиля - это сверяет recount_collection_counters
+    """
+    counter = LinkCounter(ProfileCollection, (
+        (Collection, 'collection_id', 'members_amount'),
+    ))
+
+    @staticmethod
+    def add(collection, profile):
+        return CollectionMembers.counter.add(collection=collection, profile=profile)
+
+    @staticmethod
+    def remove(profile_collection):
+        """Два одновременных запроса на удаление уменьшат members_amount только один раз"""
+        CollectionMembers.counter.remove(pk=profile_collection.pk, collection_id=profile_collection.collection_id)
+
+    @staticmethod
+    def recount():
+        return CollectionMembers.counter.recount()
+
+
 class CollectionStars(models.Model):
     """CollectionStars"""
     collection = models.OneToOneField(Collection, on_delete=models.CASCADE)
@@ -1,9 +1,10 @@
-from django.db.models import Q
+from django.db import connection
+from django.db.models import F
 from rest_framework import serializers
 
 from .models_collection import Collection, ProfileCollection, CollectionStars
-from ..course.models_course import ProfileCourseCollection
-from ..course.serializers_course import MiniCourseSerializer
+from ..course.models_course import Course, ProfileCourseCollection, course_status_registry
+from ..course.serializers_course import MiniCourseSerializer, HelperCourseSerializer
 from ..profile.serializers_profile import ProfileAsAuthor
 #####################################
 #       ##  COLLECTION ##
@@ -12,6 +13,8 @@ from ..utils import Util
 
 
 class HelperCollectionSerializer:
+    TOP_COURSES_AMOUNT = 5
+
     @staticmethod
     def get_is_added(collection, profile):
         profile_to_collection = ProfileCollection.objects.filter(collection=collection, profile=profile)
@@ -19,6 +22,59 @@ class HelperCollectionSerializer:
             return True
         return False
 
+    @staticmethod
+    def get_top_course_pk_dict(collection_pk_list, limit=TOP_COURSES_AMOUNT):
+        """
+        Первые limit выпущенных курсов каждой подборки по убыванию рейтинга одним оконным запросом
+        (ROW_NUMBER() OVER (PARTITION BY collection ORDER BY rating DESC)).
+        Нумеруются уже различные пары (подборка, курс): несколько строк ProfileCourseCollection
+        с одним курсом не должны занимать места в первых limit
+        :return: {collection_id: [course_id, ...]}
+        """
+        if len(collection_pk_list) == 0:
+            return dict()
+        status_release = course_status_registry.get_pk(Util.COURSE_STATUS_RELEASE_NAME)
+        linked = ProfileCourseCollection.objects \
+            .filter(collection__in=collection_pk_list, course__status=status_release) \
+            .annotate(course_rating=F('course__rating')) \
+            .values('collection_id', 'course_id', 'course_rating').distinct()
+        # Django 4.0 не умеет ни окно поверх DISTINCT, ни фильтр по оконной функции, поэтому внешние запросы
+        sql, params = linked.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT collection_id, course_id FROM ("
+                           f"SELECT collection_id, course_id, ROW_NUMBER() OVER ("
+                           f"PARTITION BY collection_id ORDER BY course_rating DESC, course_id ASC) AS course_rank "
+                           f"FROM ({sql}) linked) ranked "
+                           f"WHERE course_rank <= %s ORDER BY collection_id, course_rank", (*params, limit))
+            rows = cursor.fetchall()
+
+        top_course_pk_dict = dict()
+        for collection_pk, course_pk in rows:
+            top_course_pk_dict.setdefault(collection_pk, []).append(course_pk)
+        return top_course_pk_dict
+
+    @staticmethod
+    def get_context(collection_list, profile):
+        """
+        Контекст CollectionSerializer для подборок страницы: курсы подборок и состояние пользователя по ним.
+        Число запросов не зависит от количества курсов в подборках
+        """
+        collection_pk_list = [item.pk for item in collection_list]
+        top_course_pk_dict = HelperCollectionSerializer.get_top_course_pk_dict(collection_pk_list)
+        course_pk_list = sorted({pk for pk_list in top_course_pk_dict.values() for pk in pk_list})
+        courses = Course.objects.select_related('profile__user').in_bulk(course_pk_list)
+
+        context = HelperCourseSerializer.get_context(course_pk_list=course_pk_list, profile=profile)
+        context['added_collections'] = set()
+        if profile is not None:
+            added_list = ProfileCollection.objects.filter(profile=profile, collection__in=collection_pk_list)
+            context['added_collections'] = set(added_list.values_list('collection_id', flat=True))
+        context['collection_courses'] = {
+            collection_pk: [courses.get(pk) for pk in pk_list if pk in courses]
+            for collection_pk, pk_list in top_course_pk_dict.items()
+        }
+        return context
+
 
 class CollectionSerializer(serializers.ModelSerializer):
     """
@@ -40,20 +96,24 @@ class CollectionSerializer(serializers.ModelSerializer):
         return collection.profile.user.username
 
     def get_courses(self, collection):
-        courses_to_collection = ProfileCourseCollection.objects.filter(collection=collection)
-        courses = list()
-        for item in courses_to_collection:
-            if item.course.status.name == Util.COURSE_STATUS_RELEASE_NAME:
-                courses.append(MiniCourseSerializer(item.course, context={'profile': self.context.get('profile')}).data)
-        courses = sorted(courses, key=lambda x: x['rating'])[:5]
-        return courses
+        context = self.context
+        if context.get('collection_courses', None) is None:
+            context = HelperCollectionSerializer.get_context(collection_list=[collection],
+                                                             profile=self.context.get('profile'))
+        course_list = context.get('collection_courses').get(collection.pk, [])
+        return MiniCourseSerializer(course_list, many=True, context=context).data
 
     def get_is_added(self, collection):
+        added_collections = self.context.get('added_collections', None)
+        if added_collections is not None:
+            return collection.pk in added_collections
         return HelperCollectionSerializer.get_is_added(collection=collection, profile=self.context.get('profile'))
 
     def get_added_number(self, collection):
-        queryset = ProfileCollection.objects.filter(collection=collection, )
-        return len(queryset.filter(~Q(profile=self.context.get('profile'))))
+        """Сколько пользователей, кроме текущего, добавили подборку (счетчик members_amount)"""
+        if self.get_is_added(collection=collection):
+            return collection.members_amount - 1
+        return collection.members_amount
 
 
 class MiniCollectionSerializer(serializers.ModelSerializer):
@@ -91,10 +151,11 @@ class DetailCollectionSerializer(serializers.ModelSerializer):
         return ProfileAsAuthor(collection.profile).data
 
     def get_courses(self, collection):
+        status_release = course_status_registry.get_pk(Util.COURSE_STATUS_RELEASE_NAME)
         courses_to_collection = ProfileCourseCollection.objects.filter(collection=collection)
         courses = list()
         for item in courses_to_collection:
-            if item.course.status.name == Util.COURSE_STATUS_RELEASE_NAME:
+            if item.course.status_id == status_release:
                 courses.append(MiniCourseSerializer(item.course, context={'profile': self.context.get('profile')}).data)
         return courses
 
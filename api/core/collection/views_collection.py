@@ -1,13 +1,15 @@
+from django.db import IntegrityError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.response import Response
 
-from .models_collection import Profile, Collection, ProfileCollection
+from .models_collection import Profile, Collection, ProfileCollection, CollectionMembers
 from .serializers_collection import DetailCollectionSerializer, CollectionSerializer, WindowDetailCollectionSerializer, \
-    GradeCollectionSerializer, MiniCollectionSerializer
+    GradeCollectionSerializer, MiniCollectionSerializer, HelperCollectionSerializer
 
+from ..search.filters_search import SearchIndexFilter
 from ..utils import HelperFilter, HelperPaginatorValue, HelperPaginator
 
 # #########################################
@@ -22,12 +24,13 @@ class CollectionView(viewsets.ModelViewSet):
     serializer_class = CollectionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, SearchFilter, SearchIndexFilter, OrderingFilter)
     filter_fields = HelperFilter.COLLECTION_FILTER_FIELDS
     search_fields = HelperFilter.COLLECTION_SEARCH_FIELDS
     ordering_fields = HelperFilter.COLLECTION_ORDERING_FIELDS
 
     pagination_max_page = HelperPaginatorValue.COLLECTION_MAX_PAGE
+    pagination_count_strategy = HelperPaginatorValue.COLLECTION_COUNT_STRATEGY
 
     def exists_course_path(self, path):
         return len(self.queryset.filter(path=path)) != 0
@@ -42,7 +45,8 @@ class CollectionView(viewsets.ModelViewSet):
     def get_frame_pagination(self, request, queryset, max_page=None):
         if max_page is None:
             max_page = self.pagination_max_page
-        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page)
+        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page,
+                                     count_strategy=self.pagination_count_strategy)
         return {
             "count": pagination.get_count(),
             "pages": pagination.get_num_pages(),
@@ -53,18 +57,20 @@ class CollectionView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def get_collections(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.queryset.select_related('profile__user'))
         frame_pagination = self.get_frame_pagination(request, queryset)
 
-        auth = Profile.objects.get(user=self.request.user)
-        serializer = CollectionSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
+        auth = self.request.profile
+        collection_list = list(frame_pagination.get('results'))
+        serializer = CollectionSerializer(collection_list, many=True,
+                                          context=HelperCollectionSerializer.get_context(collection_list, auth))
 
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
     def get_mini_collections(self, request, *args, **kwargs):
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         queryset = self.filter_queryset(self.queryset)
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COLLECTION_MAX_PAGE)
         serializer = MiniCollectionSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
@@ -77,7 +83,7 @@ class CollectionView(viewsets.ModelViewSet):
         if not self.exists_profile_path(path):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
         profile = Profile.objects.get(path=path)
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
         self.swap_filters_field(HelperFilter.PROFILE_COLLECTION_TYPE)
         queryset = self.filter_queryset(ProfileCollection.objects.filter(profile=profile))
@@ -98,17 +104,15 @@ class CollectionView(viewsets.ModelViewSet):
         if not self.exists_profile_path(path):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
         profile = Profile.objects.get(path=path)
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
         self.swap_filters_field(HelperFilter.PROFILE_COLLECTION_TYPE)
         added_queryset = self.filter_queryset(ProfileCollection.objects.filter(profile=profile))
         self.swap_filters_field(HelperFilter.COLLECTION_TYPE)
 
-        # Исключаем созданные подборки
-        queryset = list()
-        for item in added_queryset:
-            if item.collection.profile != profile:
-                queryset.append(item.collection)
+        # Добавленные подборки без созданных в порядке добавления, пагинация в базе
+        queryset = self.queryset.exclude(profile=profile).select_related('profile__user')
+        queryset = HelperFilter.get_related_queryset(queryset, added_queryset, related_name='collection')
 
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COLLECTION_MAX_PAGE)
         serializer = MiniCollectionSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
@@ -123,7 +127,7 @@ class CollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         profile = Profile.objects.get(path=path)
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
         queryset = self.filter_queryset(self.queryset.filter(profile=profile))
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COLLECTION_MAX_PAGE)
@@ -138,7 +142,7 @@ class CollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        auth = Profile.objects.get(user=request.user)
+        auth = request.profile
         serializer = DetailCollectionSerializer(collection, context={'profile': auth})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -158,7 +162,7 @@ class ActionCollectionView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_collection(self, request):
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         number_new_collection = len(ProfileCollection.objects.filter(profile=profile)) + 1
         serializer = WindowDetailCollectionSerializer(data={'title': f"Подборка #{number_new_collection}"},
                                                       context={'profile': profile})
@@ -175,7 +179,7 @@ class ActionCollectionView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         if collection.profile != profile:
             return Response({"error": "У вас нет доступа для изменения коллекции"},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -187,7 +191,7 @@ class ActionCollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         if collection.profile != profile:
             return Response({"error": "У вас нет доступа для изменения подборки от имени этого аккаунта"},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -206,7 +210,7 @@ class ActionCollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         if collection.profile != profile:
             return Response({"error": "У вас нет доступа для удаления подборки от имени этого аккаунта"},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -238,14 +242,17 @@ class ActionProfileCollectionView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         collection = Collection.objects.get(path=path)
         profile_collection_list = ProfileCollection.objects.filter(profile=profile, collection=collection)
         if len(profile_collection_list) != 0:
             return Response({'error': "Вы уже добавили эту подборку"}, status=status.HTTP_404_NOT_FOUND)
 
-        profile_collection = ProfileCollection.objects.create(profile=profile, collection=collection)
-        profile_collection.save()
+        try:
+            CollectionMembers.add(collection=collection, profile=profile)
+        except IntegrityError:
+            # параллельный запрос успел добавить подборку
+            return Response({'error': "Вы уже добавили эту подборку"}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({
             'collection': collection.title,
@@ -257,14 +264,13 @@ class ActionProfileCollectionView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         collection = Collection.objects.get(path=path)
         profile_collection_list = ProfileCollection.objects.filter(profile=profile, collection=collection)
         if len(profile_collection_list) == 0:
             return Response({'error': "Вы уже удалили эту подборку"}, status=status.HTTP_404_NOT_FOUND)
 
-        profile_collection = profile_collection_list[0]
-        profile_collection.delete()
+        CollectionMembers.remove(profile_collection=profile_collection_list[0])
 
         return Response({
             'collection': collection.title,
@@ -291,7 +297,7 @@ class GradeCollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         serializer = GradeCollectionSerializer(data=request.data,
                                                context={'profile': profile, 'collection': collection})
         serializer.is_valid(raise_exception=True)
@@ -308,7 +314,7 @@ class GradeCollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         profile_collection = ProfileCollection.objects.get(profile=profile, collection=collection)
 
         serializer = GradeCollectionSerializer(data=request.data, instance=profile_collection)
@@ -326,7 +332,7 @@ class GradeCollectionView(viewsets.ModelViewSet):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         collection = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
 
         if collection.profile != profile:
             return Response({"error": "У вас нет доступа для удаления оценки у подборки от имени этого аккаунта"},
@@ -0,0 +1,13 @@
+import django_filters
+
+from .models_course import CourseCatalogEntry
+from ..utils import HelperFilter
+
+
+class CourseCatalogFilter(django_filters.FilterSet):
+    """Фильтры каталога: ?profile__user__username= по-прежнему фильтрует по автору (CourseCatalogEntry.author)"""
+    profile__user__username = django_filters.CharFilter(field_name='author')
+
+    class Meta:
+        model = CourseCatalogEntry
+        fields = HelperFilter.CATALOG_COURSE_FILTER_FIELDS
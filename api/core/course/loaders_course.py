@@ -0,0 +1,184 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F
+from django.utils.functional import cached_property
+
+from .models_course import Course, Theme, Lesson, Step, ProfileTheme, ProfileLesson, ProfileStep
+
+
+class CourseChain:
+    """Предки шагов (урок, тема, курс) одним запросом с JOIN"""
+
+    @staticmethod
+    def get_step_chains(step_pk_list):
+        """{step_pk: (lesson_pk, theme_pk, course_pk)}"""
+        queryset = Step.objects.filter(pk__in=step_pk_list) \
+            .values_list('pk', 'lesson_id', 'lesson__theme_id', 'lesson__theme__course_id')
+        return {step_pk: (lesson_pk, theme_pk, course_pk) for step_pk, lesson_pk, theme_pk, course_pk in queryset}
+
+
+class CourseOutline:
+    """
+    Скомпилированная структура курса (темы, уроки, шаги без content) в кеше.
+    Ключ содержит Course.version, поэтому любое изменение структуры через bump() делает старый кеш недоступным.
+    """
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    THEME_FIELDS = ('id', 'course_id', 'title', 'image_url', 'max_progress', 'progress', 'number', 'path')
+    LESSON_FIELDS = ('id', 'theme_id', 'title', 'image_url', 'max_progress', 'progress', 'number', 'path')
+    STEP_FIELDS = ('id', 'lesson_id', 'title', 'max_progress', 'number', 'path')
+
+    @staticmethod
+    def get_key(course):
+        return f"course-outline:{course.pk}:{course.version}"
+
+    @staticmethod
+    def bump(**course_lookup):
+        """Новая версия структуры курса, например bump(pk=course.pk) или bump(path=path_course)"""
+        Course.objects.filter(**course_lookup).update(version=F('version') + 1)
+
+    @staticmethod
+    def compile(course):
+        themes = Theme.objects.filter(course=course).annotate(count_lesson=Count('lesson')).order_by('number', 'pk') \
+            .values(*CourseOutline.THEME_FIELDS, 'count_lesson')
+        lessons = Lesson.objects.filter(theme__course=course).annotate(count_step=Count('step')) \
+            .order_by('number', 'pk').values(*CourseOutline.LESSON_FIELDS, 'count_step')
+        steps = list(Step.objects.filter(lesson__theme__course=course).order_by('number', 'pk')
+                     .values(*CourseOutline.STEP_FIELDS))
+        return {
+            'themes': list(themes),
+            'lessons': list(lessons),
+            'steps': steps,
+            'step_links': CourseOutline.get_step_links(steps),
+        }
+
+    @staticmethod
+    def get_step_links(steps):
+        """{step_id: (path предыдущего, path следующего)} в пределах урока, в порядке number"""
+        lesson_steps = dict()
+        for row in steps:
+            lesson_steps.setdefault(row['lesson_id'], []).append(row)
+        links = dict()
+        for step_list in lesson_steps.values():
+            for i, row in enumerate(step_list):
+                prev_path = step_list[i - 1]['path'] if i > 0 else None
+                next_path = step_list[i + 1]['path'] if i + 1 < len(step_list) else None
+                links[row['id']] = (prev_path, next_path)
+        return links
+
+    @staticmethod
+    def get(course):
+        key = CourseOutline.get_key(course)
+        outline = cache.get(key)
+        if outline is None:
+            outline = CourseOutline.compile(course)
+            cache.set(key, outline, CourseOutline.CACHE_TIMEOUT)
+        return outline
+
+    @staticmethod
+    def build(model, row, extra=()):
+        """Экземпляр модели из строки outline, как будто загружен из базы"""
+        field_names = [field.attname for field in model._meta.concrete_fields if field.attname in row]
+        instance = model.from_db(DEFAULT_DB_ALIAS, field_names, [row[name] for name in field_names])
+        for name in extra:
+            setattr(instance, name, row[name])
+        return instance
+
+
+class CourseTreeLoader:
+    """
+    Дерево курса (темы -> уроки -> шаги) из CourseOutline и прогресс профиля по нему.
+    Прогресс каждого уровня загружается одним запросом при первом обращении.
+    """
+
+    def __init__(self, course, profile=None):
+        self.course = course
+        self.profile = profile
+
+    # SKELETON
+    @cached_property
+    def outline(self):
+        return CourseOutline.get(self.course)
+
+    @cached_property
+    def themes(self):
+        return [CourseOutline.build(Theme, row, extra=('count_lesson',)) for row in self.outline['themes']]
+
+    @cached_property
+    def lessons(self):
+        return [CourseOutline.build(Lesson, row, extra=('count_step',)) for row in self.outline['lessons']]
+
+    @cached_property
+    def steps(self):
+        return [CourseOutline.build(Step, row) for row in self.outline['steps']]
+
+    def get_lessons(self, theme):
+        return [lesson for lesson in self.lessons if lesson.theme_id == theme.pk]
+
+    def get_steps(self, lesson):
+        return [step for step in self.steps if step.lesson_id == lesson.pk]
+
+    # PATHS: path уникален в пределах родителя (course, path), (theme, path), (lesson, path)
+    @cached_property
+    def theme_paths(self):
+        return {theme.path: theme for theme in self.themes}
+
+    @cached_property
+    def lesson_paths(self):
+        return {(lesson.theme_id, lesson.path): lesson for lesson in self.lessons}
+
+    @cached_property
+    def step_paths(self):
+        return {(step.lesson_id, step.path): step for step in self.steps}
+
+    def find_theme(self, path):
+        return self.theme_paths.get(path, None)
+
+    def find_lesson(self, theme, path):
+        return self.lesson_paths.get((theme.pk, path), None)
+
+    def find_step(self, lesson, path):
+        return self.step_paths.get((lesson.pk, path), None)
+
+    def get_step_links(self, step):
+        """(path предыдущего, path следующего) шага урока"""
+        return self.outline['step_links'].get(step.pk, (None, None))
+
+    @staticmethod
+    def get_count_lesson(theme):
+        return theme.count_lesson
+
+    @staticmethod
+    def get_count_step(lesson):
+        return lesson.count_step
+
+    # PROGRESS
+    @cached_property
+    def profile_themes(self):
+        if self.profile is None:
+            return dict()
+        queryset = ProfileTheme.objects.filter(profile=self.profile, theme__course=self.course)
+        return {profile_theme.theme_id: profile_theme for profile_theme in queryset}
+
+    @cached_property
+    def profile_lessons(self):
+        if self.profile is None:
+            return dict()
+        queryset = ProfileLesson.objects.filter(profile=self.profile, lesson__theme__course=self.course)
+        return {profile_lesson.lesson_id: profile_lesson for profile_lesson in queryset}
+
+    @cached_property
+    def profile_steps(self):
+        if self.profile is None:
+            return dict()
+        queryset = ProfileStep.objects.filter(profile=self.profile, step__lesson__theme__course=self.course)
+        return {profile_step.step_id: profile_step for profile_step in queryset}
+
+    def get_profile_theme(self, theme):
+        return self.profile_themes.get(theme.pk, None)
+
+    def get_profile_lesson(self, lesson):
+        return self.profile_lessons.get(lesson.pk, None)
+
+    def get_profile_step(self, step):
+        return self.profile_steps.get(step.pk, None)
@@ -1,10 +1,15 @@
 import datetime
 
 from ckeditor_uploader.fields import RichTextUploadingField
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.signals import post_save, post_delete
 
 from ..collection.models_collection import Collection
+from ..helpers.counter import TableCounter
+from ..helpers.model import CounterModel
+from ..helpers.registry import LookupRegistry
+from ..models import User
 from ..profile.models_profile import Profile
 # ############## COURSE START ###############
 from ..utils import Util
@@ -18,7 +23,12 @@ class CourseStatus(models.Model):
         return f'{self.name}'
 
 
-class Course(models.Model):
+course_status_registry = LookupRegistry(CourseStatus)
+post_save.connect(course_status_registry.invalidate, sender=CourseStatus)
+post_delete.connect(course_status_registry.invalidate, sender=CourseStatus)
+
+
+class Course(CounterModel):
     """Course"""
     title = models.CharField(max_length=64)
     description = models.TextField(max_length=175, blank=True)
@@ -28,11 +38,16 @@ class Course(models.Model):
     duration_in_minutes = models.IntegerField(default=0)
     rating = models.FloatField(default=0)
     members_amount = models.IntegerField(default=0)
+    studying_amount = models.IntegerField(default=0)
+    completed_amount = models.IntegerField(default=0)
     max_progress = models.IntegerField(default=0)
     progress = models.IntegerField(default=0)
     status = models.ForeignKey(CourseStatus, blank=True, null=True, on_delete=models.SET_NULL)
     date_create = models.DateField(default=datetime.date.today)
     path = models.CharField(max_length=64, blank=True, unique=True)
+    version = models.IntegerField(default=0)
+
+    counter_fields = ('version', 'max_progress', 'members_amount', 'studying_amount', 'completed_amount')
 
     def __str__(self):
         return f'{self.profile.user.username}: {self.title}  [Course]'
@@ -43,8 +58,7 @@ def create_course(sender, **kwargs):
     if kwargs['created']:
         course = kwargs['instance']
         course.path = course.pk
-        course_status = CourseStatus.objects.filter(name=Util.COURSE_STATUS_DEV_NAME)[0]
-        course.status = course_status
+        course.status = course_status_registry.get(Util.COURSE_STATUS_DEV_NAME)
         course.save()
 
         creator_collection = CreatorCollection.objects.create(course=course, creator=course.profile)
@@ -63,6 +77,118 @@ def create_course(sender, **kwargs):
 post_save.connect(create_course, sender=Course)
 
 
+class CourseCatalogEntry(models.Model):
+    """Read model каталога: плоская строка опубликованного курса"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE)
+    path = models.CharField(max_length=64)
+    title = models.CharField(max_length=64)
+    description = models.TextField(max_length=175, blank=True)
+    author = models.CharField(max_length=150)
+    image_url = models.ImageField(blank=True, null=True)
+    duration_in_minutes = models.IntegerField(default=0)
+    rating = models.FloatField(default=0)
+    members_amount = models.IntegerField(default=0)
+    max_progress = models.IntegerField(default=0)
+    ordering_key = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ('ordering_key',)
+        indexes = [
+            models.Index(fields=['ordering_key']),
+            models.Index(fields=['rating', 'ordering_key']),
+            models.Index(fields=['title']),
+            models.Index(fields=['author']),
+        ]
+
+    def __str__(self):
+        return f'{self.author}: {self.title}  [Catalog]'
+
+
+class CourseCatalog:
+    """Поддержка CourseCatalogEntry в актуальном состоянии"""
+
+    @staticmethod
+    def get_status_release_pk():
+        try:
+            return course_status_registry.get_pk(Util.COURSE_STATUS_RELEASE_NAME)
+        except CourseStatus.DoesNotExist:
+            return None
+
+    @staticmethod
+    def is_released(course):
+        status_release = CourseCatalog.get_status_release_pk()
+        return (status_release is not None) and (course.status_id == status_release)
+
+    @staticmethod
+    def get_entry_data(course):
+        return {
+            'path': course.path,
+            'title': course.title,
+            'description': course.description,
+            'author': course.profile.user.username,
+            'image_url': course.image_url,
+            'duration_in_minutes': course.duration_in_minutes,
+            'rating': course.rating,
+            'members_amount': course.members_amount,
+            'max_progress': course.max_progress,
+            'ordering_key': course.pk,
+        }
+
+    @staticmethod
+    def sync_course(course):
+        """
+        Счетчики курса (Course.counter_fields) меняются через F() и копируются из базы только при создании записи,
+        иначе устаревший экземпляр курса перезаписал бы их в каталоге
+        """
+        if not CourseCatalog.is_released(course):
+            CourseCatalogEntry.objects.filter(course=course).delete()
+            return None
+        data = CourseCatalog.get_entry_data(course)
+        counter_fields = [name for name in course.counter_fields if name in data]
+        for name in counter_fields:
+            data.pop(name)
+        if CourseCatalogEntry.objects.filter(course=course).update(**data) == 0:
+            if len(counter_fields) != 0:
+                data.update(Course.objects.filter(pk=course.pk).values(*counter_fields).get())
+            CourseCatalogEntry.objects.create(course=course, **data)
+
+    @staticmethod
+    def rebuild():
+        """Полная пересборка каталога"""
+        status_release = CourseCatalog.get_status_release_pk()
+        course_list = Course.objects.filter(status=status_release).select_related('profile__user')
+        CourseCatalogEntry.objects.exclude(course__in=course_list).delete()
+        for course in course_list:
+            CourseCatalog.sync_course(course)
+
+
+def sync_course_catalog(sender, **kwargs):
+    """When a course is saved, update its catalog entry"""
+    CourseCatalog.sync_course(kwargs['instance'])
+
+
+def rename_course_catalog_author(sender, **kwargs):
+    """When a user is renamed, update the author of his courses in the catalog"""
+    user = kwargs['instance']
+    CourseCatalogEntry.objects.filter(course__profile__user=user).exclude(author=user.username) \
+        .update(author=user.username)
+
+
+def rebuild_course_catalog(sender, **kwargs):
+    """When a course status is changed, rebuild the catalog"""
+    CourseCatalog.rebuild()
+
+
+post_save.connect(sync_course_catalog, sender=Course)
+post_save.connect(rename_course_catalog_author, sender=User)
+post_save.connect(rebuild_course_catalog, sender=CourseStatus)
+post_delete.connect(rebuild_course_catalog, sender=CourseStatus)
+
+course_catalog_counter = TableCounter(CourseCatalogEntry)
+post_save.connect(course_catalog_counter.increment, sender=CourseCatalogEntry)
+post_delete.connect(course_catalog_counter.decrement, sender=CourseCatalogEntry)
+
+
 class CreatorCollection(models.Model):
     """CreatorCollection"""
     creator = models.ForeignKey(Profile, on_delete=models.CASCADE)
@@ -127,15 +253,23 @@ class CourseSkill(models.Model):
 
 
 # ------------ Content Course START --------------
-class Theme(models.Model):
+class Theme(CounterModel):
     """The Course consists of Theme"""
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     title = models.CharField(max_length=64)
     image_url = models.ImageField(blank=True, null=True, default=Util.DEFAULT_IMAGES.get('theme'))
     max_progress = models.IntegerField(default=0)
     progress = models.IntegerField(default=0)
+    number = models.IntegerField(default=0)
     path = models.CharField(max_length=64, blank=True, null=True)
 
+    counter_fields = ('max_progress',)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'path'], name='unique_theme_path'),
+        ]
+
     def __str__(self):
         return f"{self.course.profile.user.username}: {self.course.title} => {self.title} [Theme]"
 
@@ -151,15 +285,23 @@ def create_theme(sender, **kwargs):
 post_save.connect(create_theme, sender=Theme)
 
 
-class Lesson(models.Model):
+class Lesson(CounterModel):
     """The Theme consists of Lesson"""
     theme = models.ForeignKey(Theme, on_delete=models.CASCADE)
     title = models.CharField(max_length=64)
     image_url = models.ImageField(blank=True, null=True, default=Util.DEFAULT_IMAGES.get('lesson'))
     max_progress = models.IntegerField(default=0)
     progress = models.IntegerField(default=0)
+    number = models.IntegerField(default=0)
     path = models.CharField(max_length=64, blank=True, null=True)
 
+    counter_fields = ('max_progress',)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['theme', 'path'], name='unique_lesson_path'),
+        ]
+
     def __str__(self):
         return f"{self.theme.course.profile.user.username}: {self.theme.course.title}: {self.theme.title}: {self.title} [Lesson]"
 
@@ -175,7 +317,7 @@ def create_lesson(sender, **kwargs):
 post_save.connect(create_lesson, sender=Lesson)
 
 
-class Step(models.Model):
+class Step(CounterModel):
     """The Lesson consists of Step"""
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     title = models.CharField(max_length=64)
@@ -184,6 +326,13 @@ class Step(models.Model):
     number = models.IntegerField(default=0)
     path = models.CharField(max_length=64, blank=True, null=True)
 
+    counter_fields = ('max_progress',)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lesson', 'path'], name='unique_step_path'),
+        ]
+
     def __str__(self):
         return f"{self.lesson.theme.course.profile.user.username} => {self.lesson.theme.course.title}: {self.lesson.theme.title} => {self.lesson.title} => {self.title} [Step]"
 
@@ -209,6 +358,11 @@ class ProfileActionsLogs(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.SET_NULL, blank=True, null=True)
     date_action = models.DateTimeField(default=datetime.datetime.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['profile', 'step', 'date_action']),
+        ]
+
     def __str__(self):
         return f"{self.profile.user.username} => {self.step.lesson.theme.course.title}: {self.step.title} [{self.date_action}]"
 
@@ -229,6 +383,11 @@ class ProfileCourseStatus(models.Model):
         return f"{self.name} [Status Profile to Course]"
 
 
+profile_course_status_registry = LookupRegistry(ProfileCourseStatus)
+post_save.connect(profile_course_status_registry.invalidate, sender=ProfileCourseStatus)
+post_delete.connect(profile_course_status_registry.invalidate, sender=ProfileCourseStatus)
+
+
 class ProfileCourse(models.Model):
     """ProfileCourse"""
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -238,6 +397,11 @@ class ProfileCourse(models.Model):
     grade = models.IntegerField(blank=True, null=True)
     date_added = models.DateField(default=datetime.date.today)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'course'], name='unique_profile_course'),
+        ]
+
     def __str__(self):
         status = None
         if self.status is not None:
@@ -250,11 +414,100 @@ def create_profile_to_course(sender, **kwargs):
     if kwargs['created']:
         profile_course = kwargs['instance']
         if profile_course.status is None:
-            profile_course.status = ProfileCourseStatus.objects.get(name=Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+            profile_course.status = profile_course_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
         profile_course.save()
+        CourseMembers.apply(course_pk=profile_course.course_id,
+                            deltas=CourseMembers.get_deltas(old_status_pk=None, new_status_pk=profile_course.status_id,
+                                                            members=1))
+
+
+def delete_profile_to_course(sender, **kwargs):
+    """When a ProfileCourse is deleted, decrement course counters"""
+    profile_course = kwargs['instance']
+    CourseMembers.apply(course_pk=profile_course.course_id,
+                        deltas=CourseMembers.get_deltas(old_status_pk=profile_course.status_id, new_status_pk=None,
+                                                        members=-1))
 
 
 post_save.connect(create_profile_to_course, sender=ProfileCourse)
+post_delete.connect(delete_profile_to_course, sender=ProfileCourse)
+
+
+class CourseMembers:
+    """
+    Счетчики курса по ProfileCourse: members_amount (все записи), studying_amount и completed_amount (по статусу).
+    Меняются через F() вместе с ProfileCourse; members_amount каталога меняется тем же способом.
+    recount (команда recount_course_counters) пересчитывает их одним агрегирующим запросом
+    """
+    STATUS_FIELDS = {
+        Util.PROFILE_COURSE_STATUS_STUDYING_NAME: 'studying_amount',
+        Util.PROFILE_COURSE_STATUS_STUDIED_NAME: 'completed_amount',
+    }
+
+    @staticmethod
+    def get_status_field(status_pk):
+        if status_pk is None:
+            return None
+        status = profile_course_status_registry.get_by_pk(status_pk)
+        if status is None:
+            return None
+        return CourseMembers.STATUS_FIELDS.get(status.name, None)
+
+    @staticmethod
+    def get_deltas(old_status_pk, new_status_pk, members=0):
+        """:return: {поле счетчика: разница}"""
+        deltas = {'members_amount': members}
+        old_field = CourseMembers.get_status_field(old_status_pk)
+        new_field = CourseMembers.get_status_field(new_status_pk)
+        if old_field is not None:
+            deltas[old_field] = deltas.get(old_field, 0) - 1
+        if new_field is not None:
+            deltas[new_field] = deltas.get(new_field, 0) + 1
+        return {name: delta for name, delta in deltas.items() if delta != 0}
+
+    @staticmethod
+    def apply(course_pk, deltas):
+        if len(deltas) == 0:
+            return None
+        Course.objects.filter(pk=course_pk).update(**{name: F(name) + delta for name, delta in deltas.items()})
+        if deltas.get('members_amount', 0) != 0:
+            CourseCatalogEntry.objects.filter(course_id=course_pk) \
+                .update(members_amount=F('members_amount') + deltas.get('members_amount'))
+
+    @staticmethod
+    def set_status(profile_course, status):
+        """Новый статус ProfileCourse и перенос его между счетчиками курса в одной транзакции"""
+        with transaction.atomic():
+            old_status_pk = ProfileCourse.objects.select_for_update().filter(pk=profile_course.pk) \
+                .values_list('status_id', flat=True).get()
+            ProfileCourse.objects.filter(pk=profile_course.pk).update(status=status)
+            CourseMembers.apply(course_pk=profile_course.course_id,
+                                deltas=CourseMembers.get_deltas(old_status_pk=old_status_pk, new_status_pk=status.pk))
+        profile_course.status = status
+
+    @staticmethod
+    def recount():
+        """Пересчитывает разошедшиеся счетчики курсов и каталога, возвращает количество курсов"""
+        status_fields = {profile_course_status_registry.get_pk(name): field
+                         for name, field in CourseMembers.STATUS_FIELDS.items()}
+        aggregates = {field: Count('pk', filter=Q(status=status_pk)) for status_pk, field in status_fields.items()}
+        actual = dict()
+        rows = ProfileCourse.objects.order_by().values('course_id').annotate(members_amount=Count('pk'), **aggregates)
+        for row in rows:
+            actual[row.pop('course_id')] = row
+
+        field_names = ['members_amount', *status_fields.values()]
+        empty = {name: 0 for name in field_names}
+        course_list = list()
+        for course_pk, *values in Course.objects.values_list('pk', *field_names):
+            counters = actual.get(course_pk, empty)
+            if [counters.get(name) for name in field_names] != values:
+                course_list.append(Course(pk=course_pk, **counters))
+        Course.objects.bulk_update(course_list, field_names, batch_size=500)
+
+        CourseCatalogEntry.objects.exclude(members_amount=F('course__members_amount')) \
+            .update(members_amount=Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('members_amount')))
+        return len(course_list)
 
 
 class ProfileCourseCollection(models.Model):
@@ -263,6 +516,15 @@ class ProfileCourseCollection(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE, blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'course', 'collection'],
+                                    name='unique_profile_course_collection'),
+            # collection = NULL ("Добавленные") не сравнивается в unique выше
+            models.UniqueConstraint(fields=['profile', 'course'], condition=models.Q(collection__isnull=True),
+                                    name='unique_profile_course_added'),
+        ]
+
     def __str__(self):
         course_title = "Добавленные"
         if self.collection is not None:
@@ -277,6 +539,11 @@ class ProfileTheme(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     progress = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'theme'], name='unique_profile_theme'),
+        ]
+
     def __str__(self):
         return f"\"{self.profile.user.username}\" to \"{self.theme.course.title}: {self.theme.title}\""
 
@@ -286,6 +553,13 @@ class ProfileLesson(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     progress = models.IntegerField(default=0)
+    # последний открытый шаг урока
+    current_step = models.ForeignKey(Step, blank=True, null=True, on_delete=models.SET_NULL, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'lesson'], name='unique_profile_lesson'),
+        ]
 
     def __str__(self):
         return f"\"{self.profile.user.username}\" to \"{self.lesson.theme.course.title}: {self.lesson.theme.title}: {self.lesson.title}\""
@@ -299,6 +573,11 @@ class ProfileStepStatus(models.Model):
         return f"{self.name} [Status Profile to Step course]"
 
 
+profile_step_status_registry = LookupRegistry(ProfileStepStatus)
+post_save.connect(profile_step_status_registry.invalidate, sender=ProfileStepStatus)
+post_delete.connect(profile_step_status_registry.invalidate, sender=ProfileStepStatus)
+
+
 class ProfileStep(models.Model):
     """ProfileStep"""
     step = models.ForeignKey(Step, on_delete=models.CASCADE)
@@ -306,19 +585,24 @@ class ProfileStep(models.Model):
     status = models.ForeignKey(ProfileStepStatus, blank=True, null=True, on_delete=models.SET_NULL)
     progress = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'step'], name='unique_profile_step'),
+        ]
+
     def __str__(self):
         return f"\"{self.profile.user.username}\" to \"{self.step.lesson.theme.course.title}: {self.step.lesson.theme.title}: {self.step.lesson.title}: {self.step.title}\""
 
 
-def create_profile_to_course(sender, **kwargs):
+def create_profile_to_step(sender, **kwargs):
     """When a ProfileStep is created, autofill fields"""
     if kwargs['created']:
         profile_step = kwargs['instance']
-        profile_step.status = ProfileStepStatus.objects.filter(name=Util.PROFILE_COURSE_STATUS_STUDYING_NAME)[0]
+        profile_step.status = profile_step_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
         profile_step.save()
 
 
-post_save.connect(create_profile_to_course, sender=ProfileStep)
+post_save.connect(create_profile_to_step, sender=ProfileStep)
 
 # -------- Profile to Course END ------------
 # ############## COURSE END #################
@@ -1,8 +1,12 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
 from rest_framework import serializers
 
 from .models_course import Course, ProfileCourse, Theme, Lesson, \
-    Step, ProfileStep, \
+    Step, ProfileStep, CourseCatalogEntry, profile_course_status_registry, profile_step_status_registry, \
     CourseInfo, CourseMainInfo, CourseFit, CourseSkill, CourseStars, ProfileTheme, ProfileLesson, ProfileActionsLogs
+from .loaders_course import CourseChain, CourseTreeLoader
 #####################################
 #         ##  COURSE ##
 #####################################
@@ -21,121 +25,281 @@ class HelperCourseSerializer:
     def get_status_progress(course, profile):
         profile_to_course = ProfileCourse.objects.filter(course=course, profile=profile)
         if len(profile_to_course) != 0:
-            status = profile_to_course[0].status
+            status = profile_course_status_registry.get_by_pk(profile_to_course[0].status_id)
             if status is not None:
                 return status.name
         return None
 
+    @staticmethod
+    def get_profile_course_dict(course_pk_list, profile):
+        """
+        Все ProfileCourse профиля для курсов страницы одним запросом
+        :return: {course_id: ProfileCourse}
+        """
+        if profile is None:
+            return dict()
+        profile_course_list = ProfileCourse.objects.filter(profile=profile, course__in=course_pk_list)
+        profile_course_dict = dict()
+        for profile_course in profile_course_list:
+            profile_course_dict.setdefault(profile_course.course_id, profile_course)
+        return profile_course_dict
+
+    @staticmethod
+    def get_context(course_pk_list, profile):
+        """Контекст для сериализаторов списка курсов"""
+        return {
+            'profile': profile,
+            'profile_courses': HelperCourseSerializer.get_profile_course_dict(course_pk_list=course_pk_list,
+                                                                              profile=profile),
+        }
+
+    @staticmethod
+    def get_catalog_context(course_pk_list, profile_id):
+        """Контекст для каталога: только id профиля из токена, сам профиль не загружается"""
+        return {
+            'profile_id': profile_id,
+            'profile_courses': HelperCourseSerializer.get_profile_course_dict(course_pk_list=course_pk_list,
+                                                                              profile=profile_id),
+        }
+
+    @staticmethod
+    def get_profile_course(course_pk, context):
+        """ProfileCourse из контекста, если он был загружен заранее, иначе из базы"""
+        profile_course_dict = context.get('profile_courses', None)
+        if profile_course_dict is not None:
+            return profile_course_dict.get(course_pk, None)
+        return ProfileCourse.objects.filter(course=course_pk, profile=context.get('profile')).first()
+
+    @staticmethod
+    def get_viewer_status_progress(course_pk, context):
+        profile_course = HelperCourseSerializer.get_profile_course(course_pk=course_pk, context=context)
+        if profile_course is None:
+            return None
+        status = profile_course_status_registry.get_by_pk(profile_course.status_id)
+        if status is None:
+            return None
+        return status.name
+
+    @staticmethod
+    def get_viewer_progress(course_pk, max_progress, context):
+        profile_course = HelperCourseSerializer.get_profile_course(course_pk=course_pk, context=context)
+        if profile_course is None:
+            return None
+        return {
+            'progress': profile_course.progress,
+            'max_progress': max_progress,
+        }
+
 
 class MaxProgressUpdater:
+    """
+    Распространяет изменение max_progress по цепочке Step -> Lesson -> Theme -> Course.
+    Каждый уровень обновляется одним UPDATE с F() в одной транзакции, поэтому одновременные правки не теряются.
+    """
+    LEVELS = (Step, Lesson, Theme, Course)
+
     @staticmethod
     def update_max_progress(old, new, step=None, lesson=None, theme=None, course=None):
         diff_max_progress = new - old
+        if diff_max_progress == 0:
+            return
 
-        generate_lesson = None
-        if step is not None:
-            MaxProgressUpdater.update_max_progress_step(step=step, diff_max_progress=diff_max_progress)
-            generate_lesson = step.lesson
-
-        generate_theme = None
-        if lesson is None:
-            lesson = generate_lesson
-        if lesson is not None:
-            MaxProgressUpdater.update_max_progress_lesson(lesson=lesson, diff_max_progress=diff_max_progress)
-            generate_theme = lesson.theme
-
-        generate_course = None
-        if theme is None:
-            theme = generate_theme
-        if theme is not None:
-            MaxProgressUpdater.update_max_progress_theme(theme=theme, diff_max_progress=diff_max_progress)
-            generate_course = theme.course
-
-        if course is None:
-            course = generate_course
-        if course is not None:
-            MaxProgressUpdater.update_max_progress_course(course=course, diff_max_progress=diff_max_progress)
-
-    @staticmethod
-    def update_max_progress_course(course, diff_max_progress):
-        course.max_progress += diff_max_progress
-        course.save()
+        deltas = MaxProgressUpdater.get_empty_deltas()
+        chain = MaxProgressUpdater.get_chain(step=step, lesson=lesson, theme=theme, course=course)
+        for model, pk in chain.items():
+            deltas[model][pk] = diff_max_progress
+        MaxProgressUpdater.apply_deltas(deltas)
+
+        for instance in (step, lesson, theme, course):
+            if instance is not None:
+                instance.max_progress += diff_max_progress
+
+    @staticmethod
+    def update_max_progress_batch(step_deltas):
+        """Пакетное изменение, step_deltas: {step_pk: diff_max_progress}, например при импорте курса"""
+        step_deltas = {pk: diff for pk, diff in step_deltas.items() if diff != 0}
+        if len(step_deltas) == 0:
+            return
+
+        deltas = MaxProgressUpdater.get_empty_deltas()
+        for step_pk, (lesson_pk, theme_pk, course_pk) in CourseChain.get_step_chains(step_deltas.keys()).items():
+            diff_max_progress = step_deltas.get(step_pk)
+            for model, pk in zip(MaxProgressUpdater.LEVELS, (step_pk, lesson_pk, theme_pk, course_pk)):
+                deltas[model][pk] = deltas[model].get(pk, 0) + diff_max_progress
+        MaxProgressUpdater.apply_deltas(deltas)
+
+    @staticmethod
+    def get_empty_deltas():
+        return {model: dict() for model in MaxProgressUpdater.LEVELS}
 
     @staticmethod
-    def update_max_progress_theme(theme, diff_max_progress):
-        theme.max_progress += diff_max_progress
-        theme.save()
+    def get_chain(step=None, lesson=None, theme=None, course=None):
+        """pk изменяемого элемента и всех его предков, не более одного запроса"""
+        chain = dict()
+        if step is not None:
+            chain[Step] = step.pk
+            chain[Lesson], chain[Theme], chain[Course] = CourseChain.get_step_chains([step.pk]).get(step.pk)
+        elif lesson is not None:
+            chain[Lesson], chain[Theme] = lesson.pk, lesson.theme_id
+            chain[Course] = Theme.objects.filter(pk=lesson.theme_id).values_list('course_id', flat=True).get()
+        elif theme is not None:
+            chain[Theme], chain[Course] = theme.pk, theme.course_id
+        elif course is not None:
+            chain[Course] = course.pk
+        return chain
 
     @staticmethod
-    def update_max_progress_lesson(lesson, diff_max_progress):
-        lesson.max_progress += diff_max_progress
-        lesson.save()
+    def get_increment(deltas, key='pk'):
+        """F('max_progress') + своя разница для каждой строки, одним выражением"""
+        whens = [When(**{key: pk}, then=Value(diff)) for pk, diff in deltas.items()]
+        return F('max_progress') + Case(*whens, default=Value(0), output_field=IntegerField())
 
     @staticmethod
-    def update_max_progress_step(step, diff_max_progress):
-        step.max_progress += diff_max_progress
-        step.save()
+    def apply_deltas(deltas):
+        with transaction.atomic():
+            for model in MaxProgressUpdater.LEVELS:
+                model_deltas = {pk: diff for pk, diff in deltas[model].items() if diff != 0}
+                if len(model_deltas) != 0:
+                    model.objects.filter(pk__in=sorted(model_deltas)) \
+                        .update(max_progress=MaxProgressUpdater.get_increment(model_deltas))
+
+            # Course.update() обходит сигналы: версия outline и каталог обновляются здесь же
+            course_deltas = {pk: diff for pk, diff in deltas[Course].items() if diff != 0}
+            if len(course_deltas) != 0:
+                Course.objects.filter(pk__in=sorted(course_deltas)).update(version=F('version') + 1)
+                CourseCatalogEntry.objects.filter(course_id__in=sorted(course_deltas)) \
+                    .update(max_progress=MaxProgressUpdater.get_increment(course_deltas, key='course_id'))
 
 
 class ProgressUpdater:
+    """
+    Прогресс профиля по цепочке ProfileStep -> ProfileLesson -> ProfileTheme -> ProfileCourse.
+    ProfileStep меняется через compare-and-set, остальные уровни через F() в одной транзакции,
+    поэтому одновременное прохождение шагов не теряет обновления.
+    """
+    LEVELS = (
+        (ProfileLesson, 'lesson_id'),
+        (ProfileTheme, 'theme_id'),
+        (ProfileCourse, 'course_id'),
+    )
 
     @staticmethod
-    def get_or_create(model, validation_data):
-        queryset = model.objects.filter(**validation_data)
-        if len(queryset) == 0:
-            return model.objects.create(**validation_data)
-        return queryset[0]
+    def update_progress(old, new, profile_step):
+        with transaction.atomic():
+            # compare-and-set: если строку успели изменить, разница считается от актуального значения
+            while old != new:
+                if ProfileStep.objects.filter(pk=profile_step.pk, progress=old).update(progress=new) != 0:
+                    break
+                old = ProfileStep.objects.filter(pk=profile_step.pk).values_list('progress', flat=True).get()
+            profile_step.progress = new
+
+            diff_progress = new - old
+            if diff_progress != 0:
+                ProgressUpdater.apply_step_deltas(profile_pk=profile_step.profile_id,
+                                                  step_deltas={profile_step.step_id: diff_progress})
 
     @staticmethod
-    def update_progress(old, new, profile_step=None, profile_lesson=None, profile_theme=None, profile_course=None):
-        diff_progress = new - old
+    def set_current_step(profile, step):
+        """Указатель на последний открытый шаг урока, строка ProfileLesson создается при первом посещении"""
+        profile_lesson_list = ProfileLesson.objects.filter(profile=profile, lesson_id=step.lesson_id)
+        if profile_lesson_list.update(current_step=step) == 0:
+            _, created = ProfileLesson.objects.get_or_create(profile=profile, lesson_id=step.lesson_id,
+                                                             defaults={'current_step': step})
+            if not created:
+                # строку успел создать параллельный запрос со своим шагом
+                profile_lesson_list.update(current_step=step)
 
-        generate_lesson = None
-        if profile_step is not None:
-            ProgressUpdater.update_progress_step(profile_step=profile_step, diff_progress=diff_progress)
-            data = {'lesson': profile_step.step.lesson, 'profile': profile_step.profile}
-            generate_lesson = ProgressUpdater.get_or_create(model=ProfileLesson, validation_data=data)
+    @staticmethod
+    def update_progress_batch(profile, step_progress):
+        """
+        Пакетное изменение прогресса профиля, step_progress: {step_pk: new_progress}.
+        Строки ProfileStep должны существовать и быть заблокированы (select_for_update) в транзакции вызывающего
+        """
+        with transaction.atomic():
+            profile_step_list = ProfileStep.objects.filter(profile=profile, step_id__in=step_progress.keys())
+            step_deltas = {step_pk: step_progress.get(step_pk) - progress
+                           for step_pk, progress in profile_step_list.values_list('step_id', 'progress')
+                           if step_progress.get(step_pk) != progress}
+            if len(step_deltas) == 0:
+                return
+
+            whens = [When(step_id=pk, then=Value(step_progress.get(pk))) for pk in step_deltas]
+            ProfileStep.objects.filter(profile=profile, step_id__in=sorted(step_deltas)) \
+                .update(progress=Case(*whens, default=F('progress'), output_field=IntegerField()))
+            ProgressUpdater.apply_step_deltas(profile_pk=profile.pk, step_deltas=step_deltas)
 
-        generate_theme = None
-        if profile_lesson is None:
-            profile_lesson = generate_lesson
-        if profile_lesson is not None:
-            ProgressUpdater.update_progress_lesson(profile_lesson=profile_lesson, diff_progress=diff_progress)
-            data = {'theme': profile_step.step.lesson.theme, 'profile': profile_step.profile}
-            generate_theme = ProgressUpdater.get_or_create(model=ProfileTheme, validation_data=data)
+    @staticmethod
+    def apply_step_deltas(profile_pk, step_deltas):
+        """Добавляет разницы шагов {step_pk: diff} к урокам, темам и курсам профиля"""
+        level_deltas = [dict() for _ in ProgressUpdater.LEVELS]
+        for step_pk, chain in CourseChain.get_step_chains(step_deltas.keys()).items():
+            for deltas, pk in zip(level_deltas, chain):
+                deltas[pk] = deltas.get(pk, 0) + step_deltas.get(step_pk)
 
-        generate_course = None
-        if profile_theme is None:
-            profile_theme = generate_theme
-        if profile_theme is not None:
-            ProgressUpdater.update_progress_theme(profile_theme=profile_theme, diff_progress=diff_progress)
-            data = {'course': profile_step.step.lesson.theme.course, 'profile': profile_step.profile}
-            generate_course = ProgressUpdater.get_or_create(model=ProfileCourse, validation_data=data)
+        for (model, key), deltas in zip(ProgressUpdater.LEVELS, level_deltas):
+            ProgressUpdater.apply_level_deltas(model=model, key=key, profile_pk=profile_pk, deltas=deltas)
 
-        if profile_course is None:
-            profile_course = generate_course
-        if profile_course is not None:
-            ProgressUpdater.update_progress_course(profile_course=profile_course, diff_progress=diff_progress)
+    @staticmethod
+    def apply_level_deltas(model, key, profile_pk, deltas):
+        deltas = {pk: diff for pk, diff in deltas.items() if diff != 0}
+        if len(deltas) == 0:
+            return
+
+        # недостающие строки уровня вставляются с progress=0 до UPDATE: строку, которую успел вставить
+        # параллельный запрос, вставка пропускает, а разница этого запроса все равно добавится ниже
+        queryset = model.objects.filter(profile_id=profile_pk, **{f"{key}__in": sorted(deltas)})
+        exists = set(queryset.values_list(key, flat=True))
+        missing = [pk for pk in sorted(deltas) if pk not in exists]
+        if model is ProfileCourse:
+            ProgressUpdater.create_profile_courses(profile_pk=profile_pk, course_pk_list=missing)
+        else:
+            model.objects.bulk_create([model(profile_id=profile_pk, **{key: pk}) for pk in missing],
+                                      ignore_conflicts=True)
+
+        whens = [When(**{key: pk}, then=Value(diff)) for pk, diff in deltas.items()]
+        queryset.update(progress=F('progress') + Case(*whens, default=Value(0), output_field=IntegerField()))
 
     @staticmethod
-    def update_progress_course(profile_course, diff_progress):
-        profile_course.progress += diff_progress
-        profile_course.save()
+    def create_profile_courses(profile_pk, course_pk_list):
+        """
+        ProfileCourse со статусом "Изучается" по одной через get_or_create: счетчики курса (CourseMembers)
+        меняет post_save только у строк, которые вставил этот запрос, а не параллельный
+        """
+        status_studying = profile_course_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+        for course_pk in course_pk_list:
+            ProfileCourse.objects.get_or_create(profile_id=profile_pk, course_id=course_pk,
+                                                defaults={'status_id': status_studying})
+
+
+class ContentOrder:
+    """
+    Порядок тем, уроков и шагов (поле number) в пределах родителя.
+    Новые номера записываются одним UPDATE ... CASE через bulk_update, только поле number
+    """
 
     @staticmethod
-    def update_progress_theme(profile_theme, diff_progress):
-        profile_theme.progress += diff_progress
-        profile_theme.save()
+    def renumber(queryset):
+        """Номера 1..n в текущем порядке (number, pk), например после удаления"""
+        item_list = list(queryset.order_by('number', 'pk').only('pk', 'number'))
+        return ContentOrder.apply(queryset.model, item_list)
 
     @staticmethod
-    def update_progress_lesson(profile_lesson, diff_progress):
-        profile_lesson.progress += diff_progress
-        profile_lesson.save()
+    def reorder(queryset, path_list):
+        """Порядок по списку path, в котором должны быть все элементы родителя ровно по одному разу"""
+        items = {item.path: item for item in queryset.only('pk', 'number', 'path')}
+        if (len(path_list) != len(items)) or (set(path_list) != set(items)):
+            raise ValueError("Нужно передать path всех элементов ровно по одному разу")
+        return ContentOrder.apply(queryset.model, [items.get(path) for path in path_list])
 
     @staticmethod
-    def update_progress_step(profile_step, diff_progress):
-        profile_step.progress += diff_progress
-        profile_step.save()
+    def apply(model, item_list):
+        changed = list()
+        for number, item in enumerate(item_list, start=1):
+            if item.number != number:
+                item.number = number
+                changed.append(item)
+        model.objects.bulk_update(changed, ['number'])
+        return item_list
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -159,23 +323,20 @@ class CourseSerializer(serializers.ModelSerializer):
     def get_quantity_in_collection(self, course):
         if self.context.get('profile', None) is None:
             return None
-        return len(ProfileCourse.objects.filter(course=course, profile=self.context.get('profile')))
+        if HelperCourseSerializer.get_profile_course(course_pk=course.pk, context=self.context) is None:
+            return 0
+        return 1
 
     def get_status_progress(self, course):
         if self.context.get('profile', None) is None:
             return None
-        return HelperCourseSerializer.get_status_progress(course=course, profile=self.context.get('profile'))
+        return HelperCourseSerializer.get_viewer_status_progress(course_pk=course.pk, context=self.context)
 
     def get_progress(self, course):
         if self.context.get('profile', None) is None:
             return None
-        profile_course_list = ProfileCourse.objects.filter(course=course, profile=self.context.get('profile'))
-        if len(profile_course_list) == 0:
-            return None
-        return {
-            'progress': profile_course_list[0].progress,
-            'max_progress': course.max_progress,
-        }
+        return HelperCourseSerializer.get_viewer_progress(course_pk=course.pk, max_progress=course.max_progress,
+                                                          context=self.context)
 
 
 class MiniCourseSerializer(serializers.ModelSerializer):
@@ -197,18 +358,54 @@ class MiniCourseSerializer(serializers.ModelSerializer):
     def get_status_progress(self, course):
         if self.context.get('profile', None) is None:
             return None
-        return HelperCourseSerializer.get_status_progress(course=course, profile=self.context.get('profile'))
+        return HelperCourseSerializer.get_viewer_status_progress(course_pk=course.pk, context=self.context)
 
     def get_progress(self, course):
         if self.context.get('profile', None) is None:
             return None
-        profile_course_list = ProfileCourse.objects.filter(course=course, profile=self.context.get('profile'))
-        if len(profile_course_list) == 0:
+        return HelperCourseSerializer.get_viewer_progress(course_pk=course.pk, max_progress=course.max_progress,
+                                                          context=self.context)
+
+
+class CatalogCourseSerializer(serializers.ModelSerializer):
+    """Курс каталога (CourseCatalogEntry)"""
+    quantity_in_collection = serializers.SerializerMethodField()
+    status_progress = serializers.SerializerMethodField(default=None)
+    progress = serializers.SerializerMethodField(default=None)
+
+    class Meta:
+        model = CourseCatalogEntry
+        fields = (
+            'path', 'title', 'description', 'author', 'image_url', 'duration_in_minutes', 'rating', 'members_amount',
+            'quantity_in_collection', 'status_progress', 'progress')
+
+    def get_quantity_in_collection(self, entry):
+        if self.context.get('profile_id', None) is None:
             return None
-        return {
-            'progress': profile_course_list[0].progress,
-            'max_progress': course.max_progress,
-        }
+        if HelperCourseSerializer.get_profile_course(course_pk=entry.course_id, context=self.context) is None:
+            return 0
+        return 1
+
+    def get_status_progress(self, entry):
+        if self.context.get('profile_id', None) is None:
+            return None
+        return HelperCourseSerializer.get_viewer_status_progress(course_pk=entry.course_id, context=self.context)
+
+    def get_progress(self, entry):
+        if self.context.get('profile_id', None) is None:
+            return None
+        return HelperCourseSerializer.get_viewer_progress(course_pk=entry.course_id, max_progress=entry.max_progress,
+                                                          context=self.context)
+
+
+class MiniCatalogCourseSerializer(CatalogCourseSerializer):
+    """Мини курс каталога (CourseCatalogEntry)"""
+
+    class Meta:
+        model = CourseCatalogEntry
+        fields = (
+            'path', 'title', 'description', 'author', 'image_url', 'duration_in_minutes', 'rating', 'members_amount',
+            'status_progress', 'progress')
 
 
 class PageCourseSerializer(serializers.ModelSerializer):
@@ -402,14 +599,23 @@ class ProfileThemeSerializer(serializers.ModelSerializer):
         fields = ('path', 'title', 'image_url', 'count_lesson', 'progress', 'is_complete')
 
     def get_count_lesson(self, theme):
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            return tree.get_count_lesson(theme)
         return len(Lesson.objects.filter(theme=theme))
 
+    def get_profile_theme(self, theme):
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            return tree.get_profile_theme(theme)
+        return ProfileTheme.objects.filter(theme=theme, profile_id=self.context.get('profile_id')).first()
+
     def get_progress(self, theme):
-        profile_theme_list = ProfileTheme.objects.filter(theme=theme, profile=self.context.get('profile'))
-        if len(profile_theme_list) == 0:
+        profile_theme = self.get_profile_theme(theme=theme)
+        if profile_theme is None:
             return None
         return {
-            'progress': profile_theme_list[0].progress,
+            'progress': profile_theme.progress,
             'max_progress': theme.max_progress,
         }
 
@@ -420,13 +626,19 @@ class ProfileThemeSerializer(serializers.ModelSerializer):
         return False
 
 
+class ReorderSerializer(serializers.Serializer):
+    """Новый порядок тем/уроков/шагов: path всех элементов родителя"""
+    paths = serializers.ListField(child=serializers.CharField(max_length=64), allow_empty=False)
+
+
 class ActionThemeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Theme
         fields = ('title', 'image_url', 'max_progress', 'path')
 
     def create(self, validated_data):
-        return Theme.objects.create(**validated_data, course=self.context.get('course'))
+        return Theme.objects.create(**validated_data, course=self.context.get('course'),
+                                    number=self.context.get('number'))
 
     def update(self, instance, validated_data):
         instance.title = validated_data.get('title', instance.title)
@@ -434,7 +646,8 @@ class ActionThemeSerializer(serializers.ModelSerializer):
         new_path = validated_data.get('path', None)
         if new_path is not None:
             new_path = Util.get_update_path(new_path=new_path)
-        instance.path = Util.get_new_path(new_path=new_path, old_path=instance.path, model=Theme)
+        instance.path = Util.get_new_path(new_path=new_path, old_path=instance.path, model=Theme,
+                                          scope={'course_id': instance.course_id})
 
         new_image = validated_data.get('image_url', -1)
         if new_image != -1:
@@ -464,14 +677,23 @@ class ProfileLessonSerializer(serializers.ModelSerializer):
         fields = ('path', 'title', 'image_url', 'current_step', 'count_step', 'progress', 'is_complete')
 
     def get_count_step(self, lesson):
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            return tree.get_count_step(lesson)
         return len(Step.objects.filter(lesson=lesson))
 
+    def get_profile_lesson(self, lesson):
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            return tree.get_profile_lesson(lesson)
+        return ProfileLesson.objects.filter(lesson=lesson, profile_id=self.context.get('profile_id')).first()
+
     def get_progress(self, lesson):
-        profile_lesson_list = ProfileLesson.objects.filter(lesson=lesson, profile=self.context.get('profile'))
-        if len(profile_lesson_list) == 0:
+        profile_lesson = self.get_profile_lesson(lesson=lesson)
+        if profile_lesson is None:
             return None
         return {
-            'progress': profile_lesson_list[0].progress,
+            'progress': profile_lesson.progress,
             'max_progress': lesson.max_progress,
         }
 
@@ -485,20 +707,25 @@ class ProfileLessonSerializer(serializers.ModelSerializer):
         link_old = self.context.get('request').build_absolute_uri()
         return "/".join(link_old.split('/')[:-1])
 
+    def get_step_list(self, lesson):
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            return tree.get_steps(lesson)
+        return list(Step.objects.filter(lesson=lesson).order_by('number', 'pk'))
+
     def get_current_step(self, lesson):
-        step_list = Step.objects.filter(lesson=lesson)
+        """Последний открытый шаг урока (ProfileLesson.current_step), иначе первый"""
+        step_list = self.get_step_list(lesson=lesson)
         if len(step_list) == 0:
             return None
-        logs = ProfileActionsLogs.objects.filter(step__in=step_list)
-        if len(logs) == 0:
-            return f"{self.get_link()}/{lesson.path}/steps/{step_list[0].path}"
-        current_step = logs[0]
-        last_date = current_step.date_action
-        for log in logs:
-            if log.date_action > last_date:
-                last_date = log.date_action
-                current_step = log
-        return f"{self.get_link()}/{lesson.path}/steps/{current_step.step.path}"
+        current_step = step_list[0]
+        profile_lesson = self.get_profile_lesson(lesson=lesson)
+        if (profile_lesson is not None) and (profile_lesson.current_step_id is not None):
+            for step in step_list:
+                if step.pk == profile_lesson.current_step_id:
+                    current_step = step
+                    break
+        return f"{self.get_link()}/{lesson.path}/steps/{current_step.path}"
 
 
 class ActionLessonSerializer(serializers.ModelSerializer):
@@ -512,7 +739,8 @@ class ActionLessonSerializer(serializers.ModelSerializer):
         return len(Step.objects.filter(lesson=lesson))
 
     def create(self, validated_data):
-        return Lesson.objects.create(**validated_data, theme=self.context.get('theme'))
+        return Lesson.objects.create(**validated_data, theme=self.context.get('theme'),
+                                     number=self.context.get('number'))
 
     def update(self, instance, validated_data):
         instance.title = validated_data.get('title', instance.title)
@@ -542,10 +770,15 @@ class GetStepSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_complete(self, step):
-        profile_step_list = ProfileStep.objects.filter(step=step, profile=self.context.get('profile'))
-        if len(profile_step_list) == 0:
+        tree = self.context.get('tree', None)
+        if tree is not None:
+            profile_step = tree.get_profile_step(step)
+        else:
+            profile_step = ProfileStep.objects.filter(step=step, profile_id=self.context.get('profile_id')).first()
+        if profile_step is None:
             return False
-        if profile_step_list[0].status.name == Util.PROFILE_COURSE_STATUS_STUDIED_NAME:
+        status_studied = profile_step_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
+        if profile_step.status_id == status_studied:
             return True
         return False
 
@@ -563,7 +796,7 @@ class GetStepSerializer(serializers.ModelSerializer):
         if (new_progress is not None) and (new_progress != instance.progress):
             ProgressUpdater.update_progress(old=instance.progress, new=new_progress, profile_step=instance)
 
-        instance.save()
+        instance.save(update_fields=['status'])
         return instance
 
 
@@ -599,10 +832,79 @@ class ProfileStepSerializer(serializers.ModelSerializer):
         if (new_progress is not None) and (new_progress != instance.progress):
             ProgressUpdater.update_progress(old=instance.progress, new=new_progress, profile_step=instance)
 
-        instance.save()
+        instance.save(update_fields=['status'])
         return instance
 
 
+class CompleteStepItemSerializer(serializers.Serializer):
+    theme = serializers.CharField(max_length=64)
+    lesson = serializers.CharField(max_length=64)
+    step = serializers.CharField(max_length=64)
+    date_action = serializers.DateTimeField(required=False)
+
+
+class CompleteStepBatchSerializer(serializers.Serializer):
+    """Пакетное прохождение шагов курса (синхронизация офлайн-клиентов)"""
+    MAX_STEPS = 500
+
+    steps = CompleteStepItemSerializer(many=True, allow_empty=False)
+
+    def validate_steps(self, items):
+        if len(items) > self.MAX_STEPS:
+            raise serializers.ValidationError(f"Не больше {self.MAX_STEPS} шагов за один запрос")
+
+        tree = self.context.get('tree')
+        not_found = list()
+        resolved = dict()
+        for item in items:
+            theme = tree.find_theme(item.get('theme'))
+            lesson = tree.find_lesson(theme, item.get('lesson')) if theme is not None else None
+            step = tree.find_step(lesson, item.get('step')) if lesson is not None else None
+            if step is None:
+                not_found.append(f"{item.get('theme')}/{item.get('lesson')}/{item.get('step')}")
+            elif step.pk not in resolved:
+                resolved[step.pk] = (step, item.get('date_action', timezone.now()))
+        if len(not_found) != 0:
+            raise serializers.ValidationError(f"Таких шагов не существует: {', '.join(not_found)}")
+        return list(resolved.values())
+
+    def create(self, validated_data):
+        profile = self.context.get('profile')
+        step_list = validated_data.get('steps')
+        step_pk_list = [step.pk for step, _ in step_list]
+        status_studied = profile_step_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
+
+        with transaction.atomic():
+            # повтор пакета, пока первый запрос еще выполняется, - обычная ситуация при синхронизации:
+            # вставка пропускает уже существующие шаги, а блокировка строк ProfileStep профиля
+            # заставляет повтор дождаться commit первого запроса до проверки журнала ниже
+            ProfileStep.objects.bulk_create([ProfileStep(profile=profile, step_id=step.pk, status=status_studied)
+                                             for step, _ in step_list], ignore_conflicts=True)
+            profile_step_list = ProfileStep.objects.filter(profile=profile, step_id__in=step_pk_list)
+            list(profile_step_list.select_for_update().values_list('pk', flat=True))
+            profile_step_list.exclude(status=status_studied).update(status=status_studied)
+
+            ProgressUpdater.update_progress_batch(profile=profile,
+                                                  step_progress={step.pk: step.max_progress for step, _ in step_list})
+
+            logs = set(ProfileActionsLogs.objects.filter(profile=profile, step_id__in=step_pk_list)
+                       .values_list('step_id', flat=True))
+            ProfileActionsLogs.objects.bulk_create([
+                ProfileActionsLogs(profile=profile, step_id=step.pk, date_action=date_action)
+                for step, date_action in step_list if step.pk not in logs
+            ])
+
+            # "продолжить" - последний по date_action шаг каждого урока пакета
+            last_steps = dict()
+            for step, date_action in step_list:
+                last = last_steps.get(step.lesson_id, None)
+                if (last is None) or (date_action >= last[1]):
+                    last_steps[step.lesson_id] = (step, date_action)
+            for step, _ in last_steps.values():
+                ProgressUpdater.set_current_step(profile=profile, step=step)
+        return step_list
+
+
 class StepSerializer(serializers.ModelSerializer):
     is_complete = serializers.SerializerMethodField(default=False)
     prev = serializers.SerializerMethodField()
@@ -616,7 +918,8 @@ class StepSerializer(serializers.ModelSerializer):
         profile_step_list = ProfileStep.objects.filter(step=step, profile=self.context.get('profile'))
         if len(profile_step_list) == 0:
             return False
-        if profile_step_list[0].status.name == Util.PROFILE_COURSE_STATUS_STUDIED_NAME:
+        status_studied = profile_step_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
+        if profile_step_list[0].status_id == status_studied:
             return True
         return False
 
@@ -624,17 +927,24 @@ class StepSerializer(serializers.ModelSerializer):
         link_old = self.context.get('request').build_absolute_uri()
         return "/".join(link_old.split('/')[:-2])
 
-    def get_prev(self, step):
-        if step.number == 1:
+    def get_step_links(self, step):
+        """Соседние шаги из CourseOutline (context['tree']), без запросов к шагам"""
+        tree = self.context.get('tree', None)
+        if tree is None:
+            tree = CourseTreeLoader(course=Course.objects.get(theme__lesson__step=step))
+            self.context['tree'] = tree
+        return tree.get_step_links(step)
+
+    def get_link_step(self, path):
+        if path is None:
             return None
-        step_prev = Step.objects.get(number=step.number - 1)
-        return f"{self.get_link()}/{step_prev.path}"
+        return f"{self.get_link()}/{path}"
+
+    def get_prev(self, step):
+        return self.get_link_step(self.get_step_links(step)[0])
 
     def get_next(self, step):
-        if step.number == len(Step.objects.filter(lesson=step.lesson)):
-            return None
-        step_next = Step.objects.get(number=step.number + 1)
-        return f"{self.get_link()}/{step_next.path}"
+        return self.get_link_step(self.get_step_links(step)[1])
 
 
 class ActionStepSerializer(serializers.ModelSerializer):
@@ -644,9 +954,7 @@ class ActionStepSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def update_numbers(step_list):
-        for i in range(len(step_list)):
-            step_list[i].number = i + 1
-            step_list[i].save()
+        return ContentOrder.renumber(step_list)
 
     def create(self, validated_data):
         lesson = self.context.get('lesson')
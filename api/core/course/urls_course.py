@@ -51,6 +51,8 @@ urlpatterns = [
          CourseCompletionPageView.as_view({'get': 'get_title_course'})),
     path('courses/learn/<slug:path_course>/themes/',
          CourseCompletionPageView.as_view({'get': 'get_themes'})),
+    path('courses/learn/<slug:path_course>/complete-batch/',
+         CourseCompletionPageView.as_view({'post': 'complete_step_batch'})),
     path('courses/learn/<slug:path_course>/themes/<slug:path_theme>/title/',
          CourseCompletionPageView.as_view({'get': 'get_title_theme'})),
     path('courses/learn/<slug:path_course>/themes/<slug:path_theme>/lessons/',
@@ -70,6 +72,8 @@ urlpatterns = [
          ThemeView.as_view({'put': 'update_theme'})),
     path('courses/creating/<slug:path_course>/delete/theme/<slug:path_theme>/',
          ThemeView.as_view({'delete': 'delete_theme'})),
+    path('courses/creating/<slug:path>/reorder/themes/',
+         ThemeView.as_view({'put': 'reorder_themes'})),
 
     # LESSON
     path('courses/creating/<slug:path_course>/theme/<slug:path_theme>/create/lesson/',
@@ -80,6 +84,8 @@ urlpatterns = [
          LessonView.as_view({'put': 'update_lesson'})),
     path('courses/creating/<slug:path_course>/theme/<slug:path_theme>/delete/lesson/<slug:path_lesson>/',
          LessonView.as_view({'delete': 'delete_lesson'})),
+    path('courses/creating/<slug:path_course>/theme/<slug:path_theme>/reorder/lessons/',
+         LessonView.as_view({'put': 'reorder_lessons'})),
 
     # STEP
     path('courses/creating/<slug:path_course>/theme/<slug:path_theme>/lesson/<slug:path_lesson>/create/step/',
@@ -93,6 +99,8 @@ urlpatterns = [
     path(
         'courses/creating/<slug:path_course>/theme/<slug:path_theme>/lesson/<slug:path_lesson>/delete/step/<slug:path_step>/',
         StepView.as_view({'delete': 'delete_step'})),
+    path('courses/creating/<slug:path_course>/theme/<slug:path_theme>/lesson/<slug:path_lesson>/reorder/steps/',
+         StepView.as_view({'put': 'reorder_steps'})),
     path(
         'courses/learn/<slug:path_course>/themes/<slug:path_theme>/lessons/<slug:path_lesson>/steps/<slug:path_step>/complete/',
         CourseCompletionPageView.as_view({'put': 'complete_step'})),
@@ -1,3 +1,5 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
 from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
@@ -8,34 +10,44 @@ from rest_framework.response import Response
 
 from .models_course import Course, CourseInfo, ProfileCourse, CourseStatus, ProfileCourseCollection, Theme, Lesson, \
     Step, ProfileCourseStatus, CourseFit, CourseSkill, CourseMainInfo, ProfileActionsLogs, ProfileStep, \
-    ProfileStepStatus
+    ProfileStepStatus, CourseCatalogEntry, course_status_registry, profile_course_status_registry, \
+    profile_step_status_registry, CourseMembers
 from .serializers_course import GradeCourseSerializer, PageCourseSerializer, PageInfoCourseSerializer, CourseSerializer, \
     MiniCourseSerializer, ActionThemeSerializer, ActionLessonSerializer, ActionStepSerializer, ProfileThemeSerializer, \
     CourseTitleSerializer, ThemeTitleSerializer, ProfileLessonSerializer, GetStepSerializer, StepSerializer, \
-    MaxProgressUpdater, CourseFitSerializer, CourseSkillSerializer, EditPageInfoCourseSerializer, ProfileStepSerializer
+    MaxProgressUpdater, ProgressUpdater, CourseFitSerializer, CourseSkillSerializer, EditPageInfoCourseSerializer, \
+    ProfileStepSerializer, HelperCourseSerializer, CatalogCourseSerializer, MiniCatalogCourseSerializer, \
+    CompleteStepBatchSerializer, ContentOrder, ReorderSerializer
+from .filters_course import CourseCatalogFilter
+from .loaders_course import CourseTreeLoader, CourseOutline
+from ..auth.middleware_auth import ProfileMiddleware
 from ..collection.models_collection import Collection
 from ..profile.models_profile import Profile
+from ..search.filters_search import SearchIndexFilter
 from ..utils import Util, HelperFilter, HelperPaginator, HelperPaginatorValue
 
 
 class CourseView(viewsets.ModelViewSet):
     """Курсы"""
     lookup_field = 'slug'
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('profile__user')
     permission_classes = [permissions.IsAuthenticated]
 
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, SearchFilter, SearchIndexFilter, OrderingFilter)
     filter_fields = HelperFilter.COURSE_FILTER_FIELDS
+    filterset_class = None
     search_fields = HelperFilter.COURSE_SEARCH_FIELDS
     ordering_fields = HelperFilter.COURSE_ORDERING_FIELDS
 
     pagination_max_page = HelperPaginatorValue.COURSE_MAX_PAGE
+    pagination_count_strategy = HelperPaginatorValue.COURSE_COUNT_STRATEGY
 
     @staticmethod
     def exists_access_page(course, profile):
-        status_development = CourseStatus.objects.get(name=Util.COURSE_STATUS_DEV_NAME)
-        status_released = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
-        if (course.status == status_released) or (course.status == status_development and profile == course.profile):
+        status_development = course_status_registry.get_pk(Util.COURSE_STATUS_DEV_NAME)
+        status_released = course_status_registry.get_pk(Util.COURSE_STATUS_RELEASE_NAME)
+        if (course.status_id == status_released) or \
+                (course.status_id == status_development and profile.pk == course.profile_id):
             return True
         return False
 
@@ -49,7 +61,8 @@ class CourseView(viewsets.ModelViewSet):
     def get_frame_pagination(self, request, queryset, max_page=None):
         if max_page is None:
             max_page = self.pagination_max_page
-        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page)
+        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page,
+                                     count_strategy=self.pagination_count_strategy)
         return {
             "count": pagination.get_count(),
             "pages": pagination.get_num_pages(),
@@ -62,24 +75,35 @@ class CourseView(viewsets.ModelViewSet):
         (self.filter_fields, self.search_fields, self.ordering_fields) = HelperFilter.get_filters_course_field(
             type_filter)
 
+    def get_catalog_queryset(self):
+        """Опубликованные курсы из read model каталога"""
+        self.swap_filters_field(HelperFilter.CATALOG_COURSE_TYPE)
+        self.filterset_class = CourseCatalogFilter
+        queryset = self.filter_queryset(CourseCatalogEntry.objects.all())
+        self.filterset_class = None
+        self.swap_filters_field(HelperFilter.COURSE_TYPE)
+        return queryset
+
     @action(methods=['get'], detail=False)
     def get_courses(self, request, *args, **kwargs):
-        auth = Profile.objects.get(user=self.request.user)
-        status_release = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
-        queryset = self.filter_queryset(self.queryset.filter(status=status_release))
+        profile_id = ProfileMiddleware.get_profile_id(request)
+        queryset = self.get_catalog_queryset()
         frame_pagination = self.get_frame_pagination(request, queryset)
-        serializer = CourseSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
+        context = HelperCourseSerializer.get_catalog_context(
+            course_pk_list=[entry.course_id for entry in frame_pagination.get('results')], profile_id=profile_id)
+        serializer = CatalogCourseSerializer(frame_pagination.get('results'), many=True, context=context)
 
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=False)
     def get_mini_courses(self, request, *args, **kwargs):
-        auth = Profile.objects.get(user=self.request.user)
-        status_release = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
-        queryset = self.filter_queryset(self.queryset.filter(status=status_release))
+        profile_id = ProfileMiddleware.get_profile_id(request)
+        queryset = self.get_catalog_queryset()
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
-        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
+        context = HelperCourseSerializer.get_catalog_context(
+            course_pk_list=[entry.course_id for entry in frame_pagination.get('results')], profile_id=profile_id)
+        serializer = MiniCatalogCourseSerializer(frame_pagination.get('results'), many=True, context=context)
 
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
@@ -90,21 +114,17 @@ class CourseView(viewsets.ModelViewSet):
         if not self.exists_profile_path(path):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
-        # Получаем созданные и добавленные курсы
+        # Созданные и добавленные курсы одним запросом, пагинация в базе
         profile = Profile.objects.get(path=path)
-        added_profile_course = ProfileCourse.objects.filter(profile=profile)
-        created_queryset = self.queryset.filter(profile=profile)
-        queryset_list = [item.course.pk for item in added_profile_course]
-        for item in created_queryset:
-            queryset_list.append(item.pk)
-        new_queryset = self.queryset.filter(pk__in=queryset_list)
-
-        queryset = self.filter_queryset(new_queryset)
+        is_added = Exists(ProfileCourse.objects.filter(profile=profile, course=OuterRef('pk')))
+        queryset = self.filter_queryset(self.queryset.filter(Q(profile=profile) | is_added).order_by('pk'))
 
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
-        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
+        context = HelperCourseSerializer.get_context(
+            course_pk_list=[course.pk for course in frame_pagination.get('results')], profile=auth)
+        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context=context)
         frame_pagination['results'] = serializer.data
 
         return Response(frame_pagination, status=status.HTTP_200_OK)
@@ -115,17 +135,19 @@ class CourseView(viewsets.ModelViewSet):
         if not self.exists_profile_path(path):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
         profile = Profile.objects.get(path=path)
         self.swap_filters_field(HelperFilter.PROFILE_COURSE_TYPE)
-        profile_queryset = self.filter_queryset(ProfileCourse.objects.filter(profile=profile))
+        added_queryset = self.filter_queryset(ProfileCourse.objects.filter(profile=profile))
         self.swap_filters_field(HelperFilter.COURSE_TYPE)
 
-        queryset = [item.course for item in profile_queryset]
+        # Курсы в порядке добавления (или по ?ordering=course__*), пагинация в базе
+        queryset = HelperFilter.get_related_queryset(self.queryset, added_queryset, related_name='course')
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
-        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True,
-                                          context={'profile': auth})
+        context = HelperCourseSerializer.get_context(
+            course_pk_list=[course.pk for course in frame_pagination.get('results')], profile=auth)
+        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context=context)
 
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
@@ -136,12 +158,14 @@ class CourseView(viewsets.ModelViewSet):
         if not self.exists_profile_path(path):
             return Response({'error': "Такого пользователя не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
         profile = Profile.objects.get(path=path)
         queryset = self.filter_queryset(self.queryset.filter(profile=profile))
         frame_pagination = self.get_frame_pagination(request, queryset, HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
-        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context={'profile': auth})
+        context = HelperCourseSerializer.get_context(
+            course_pk_list=[course.pk for course in frame_pagination.get('results')], profile=auth)
+        serializer = MiniCourseSerializer(frame_pagination.get('results'), many=True, context=context)
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
@@ -152,7 +176,7 @@ class CourseView(viewsets.ModelViewSet):
             return Response({'error': "Такого курса не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         course = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         if not self.exists_access_page(course=course, profile=profile):
             return Response({'error': "У вас нет доступа к этой странице"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -186,7 +210,7 @@ class ActionCourseView(viewsets.ModelViewSet):
                 'error': "Вы не ввели название курса",
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         course = Course.objects.create(title=course_title, profile=auth)
         course.save()
         return Response({
@@ -197,11 +221,11 @@ class ActionCourseView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['delete'])
     def delete_course(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = self.queryset.get(path=path)
+        course = resolved.get('course')
         MaxProgressUpdater.update_max_progress(old=course.max_progress, new=0, course=course)
         course.delete()
         return Response({
@@ -212,12 +236,12 @@ class ActionCourseView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def publish_course(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = self.queryset.get(path=path)
-        course.status = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
+        course = resolved.get('course')
+        course.status = course_status_registry.get(Util.COURSE_STATUS_RELEASE_NAME)
         course.save()
         return Response({
             'path': course.path,
@@ -228,12 +252,12 @@ class ActionCourseView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def development_course(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = self.queryset.get(path=path)
-        course.status = CourseStatus.objects.get(name=Util.COURSE_STATUS_DEV_NAME)
+        course = resolved.get('course')
+        course.status = course_status_registry.get(Util.COURSE_STATUS_DEV_NAME)
         course.save()
         return Response({
             'path': course.path,
@@ -249,11 +273,11 @@ class CoursePageView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def get_page(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path)
+        course = resolved.get('course')
         course_info = CourseInfo.objects.get(course=course)
         serializer = EditPageInfoCourseSerializer(course_info)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -312,11 +336,11 @@ class CoursePageView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['put'])
     def save_page(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path)
+        course = resolved.get('course')
         course_info = CourseInfo.objects.get(course=course)
         self.update_course(request=request, course_info=course_info)
         self.update_main_info(request=request, course_info=course_info)
@@ -339,11 +363,11 @@ class CourseFitView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_fit(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path)
+        course = resolved.get('course')
         course_info = CourseInfo.objects.get(course=course)
         number_new = len(self.queryset.filter(course_info=course_info)) + 1
         data = {
@@ -363,9 +387,9 @@ class CourseFitView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['put'])
     def update_fit(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
         exists_fit = self.exists(pk=request.data.get('pk', None))
         if exists_fit.get('error', None) is not None:
@@ -385,9 +409,9 @@ class CourseFitView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['delete'])
     def delete_fit(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
         exists_fit = self.exists(pk=request.data.get('pk', None))
         if exists_fit.get('error', None) is not None:
@@ -415,11 +439,11 @@ class CourseSkillView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_skill(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path)
+        course = resolved.get('course')
         course_info = CourseInfo.objects.get(course=course)
         number_new = len(self.queryset.filter(course_info=course_info)) + 1
         data = {'name': f"Умение #{number_new}"}
@@ -435,9 +459,9 @@ class CourseSkillView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['put'])
     def update_skill(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
         exists = self.exists(pk=request.data.get('pk', None))
         if exists.get('error', None) is not None:
@@ -456,9 +480,9 @@ class CourseSkillView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['delete'])
     def delete_skill(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
         exists = self.exists(pk=request.data.get('pk', None))
         if exists.get('error', None) is not None:
@@ -480,24 +504,23 @@ class CourseCompletionPageView(viewsets.ModelViewSet):
     # PAGE THEMES
     @action(detail=False, methods=['get'])
     def get_title_course(self, request, path_course):
-        exists = PathValidator.exists(path_course=path_course)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve(path_course=path_course)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path_course)
+        course = resolved.get('course')
         serializer = CourseTitleSerializer(course)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
     def get_themes(self, request, path_course):
-        exists = PathValidator.exists(path_course=path_course)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        profile_id = ProfileMiddleware.get_profile_id(request)
+        resolved = PathValidator.resolve_tree(profile=profile_id, path_course=path_course)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        course = Course.objects.get(path=path_course)
-        theme_list = Theme.objects.filter(course=course)
-        serializer = ProfileThemeSerializer(theme_list, many=True, context={'profile': auth})
+        tree = resolved.get('tree')
+        serializer = ProfileThemeSerializer(tree.themes, many=True, context={'profile_id': profile_id, 'tree': tree})
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -506,24 +529,23 @@ class CourseCompletionPageView(viewsets.ModelViewSet):
     # PAGE LESSONS
     @action(detail=False, methods=['get'])
     def get_title_theme(self, request, path_course, path_theme):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve_tree(path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        theme = Theme.objects.get(path=path_theme)
-        serializer = ThemeTitleSerializer(theme)
+        serializer = ThemeTitleSerializer(resolved.get('theme'))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
     def get_lessons(self, request, path_course, path_theme):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
-
-        auth = Profile.objects.get(user=self.request.user)
-        theme = Theme.objects.get(path=path_theme)
-        lesson_list = Lesson.objects.filter(theme=theme)
-        serializer = ProfileLessonSerializer(lesson_list, many=True, context={'profile': auth, 'request': request})
+        profile_id = ProfileMiddleware.get_profile_id(request)
+        resolved = PathValidator.resolve_tree(profile=profile_id, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
+
+        tree = resolved.get('tree')
+        serializer = ProfileLessonSerializer(tree.get_lessons(resolved.get('theme')), many=True,
+                                             context={'profile_id': profile_id, 'request': request, 'tree': tree})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     # ###########
@@ -531,50 +553,51 @@ class CourseCompletionPageView(viewsets.ModelViewSet):
     # PAGE STEPS
     @action(detail=False, methods=['get'])
     def get_steps(self, request, path_course, path_theme, path_lesson, path_step):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme, path_lesson=path_lesson,
-                                      path_step=path_step)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        profile_id = ProfileMiddleware.get_profile_id(request)
+        resolved = PathValidator.resolve_tree(profile=profile_id, path_course=path_course, path_theme=path_theme,
+                                              path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        lesson = Lesson.objects.get(path=path_lesson)
-        step_list = Step.objects.filter(lesson=lesson)
-        current_step = step_list.get(path=path_step)
-        serializer = GetStepSerializer(step_list, many=True,
-                                       context={'profile': auth, 'current_step': current_step})
+        tree = resolved.get('tree')
+        step_list = tree.get_steps(resolved.get('lesson'))
+        serializer = GetStepSerializer(step_list, many=True, context={'profile_id': profile_id, 'tree': tree,
+                                                                     'current_step': resolved.get('step')})
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @staticmethod
-    def add_profile_action_logs(profile, step):
-        if len(ProfileCourse.objects.filter(profile=profile, course=step.lesson.theme.course)) != 0:
-            if len(ProfileStep.objects.filter(profile=profile, step=step)) != 0:
-                if len(ProfileActionsLogs.objects.filter(profile=profile, step=step)) == 0:
+    def add_profile_action_logs(profile, step, course_id):
+        """course_id - курс шага из уже проверенного пути, без обхода step.lesson.theme.course"""
+        if ProfileCourse.objects.filter(profile=profile, course_id=course_id).exists():
+            ProgressUpdater.set_current_step(profile=profile, step=step)
+            if ProfileStep.objects.filter(profile=profile, step=step).exists():
+                if not ProfileActionsLogs.objects.filter(profile=profile, step=step).exists():
                     profile_action_logs = ProfileActionsLogs.objects.create(profile=profile, step=step)
                     profile_action_logs.save()
                     return True
         return False
 
     @staticmethod
-    def add_profile_step(profile, step):
+    def add_profile_step(profile, step, course_id):
         profile_step_list = ProfileStep.objects.filter(profile=profile, step=step)
         if len(profile_step_list) == 0:
             profile_step = ProfileStep.objects.create(profile=profile, step=step)
             profile_step.save()
-        CourseCompletionPageView.add_profile_action_logs(profile=profile, step=step)
+        CourseCompletionPageView.add_profile_action_logs(profile=profile, step=step, course_id=course_id)
 
     @action(detail=False, methods=['get'])
     def get_detail_step(self, request, path_course, path_theme, path_lesson, path_step):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme, path_lesson=path_lesson,
-                                      path_step=path_step)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve_tree(path_course=path_course, path_theme=path_theme,
+                                              path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        step = Step.objects.get(path=path_step)
-        serializer = StepSerializer(step, context={'profile': auth, 'request': request})
+        auth = self.request.profile
+        step = Step.objects.get(pk=resolved.get('step').pk)
+        serializer = StepSerializer(step, context={'profile': auth, 'request': request, 'tree': resolved.get('tree')})
 
-        self.add_profile_step(profile=auth, step=step)
+        self.add_profile_step(profile=auth, step=step, course_id=resolved.get('course').pk)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -587,41 +610,66 @@ class CourseCompletionPageView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['put'])
     def complete_step(self, request, path_course, path_theme, path_lesson, path_step):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme, path_lesson=path_lesson,
-                                      path_step=path_step)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve_tree(path_course=path_course, path_theme=path_theme,
+                                              path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        step = Step.objects.get(path=path_step)
+        auth = self.request.profile
+        step = resolved.get('step')
 
         self.exists_profile_step(profile=auth, step=step)
         profile_step = ProfileStep.objects.get(profile=auth, step=step)
-        new_status = ProfileStepStatus.objects.filter(name=Util.PROFILE_COURSE_STATUS_STUDIED_NAME)[0]
+        new_status = profile_step_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
         serializer = ProfileStepSerializer(instance=profile_step, data={}, context={'status': new_status})
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
         return Response({'message': "Вы успешно изучили step!"}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def complete_step_batch(self, request, path_course):
+        auth = self.request.profile
+        resolved = PathValidator.resolve_tree(profile=auth, path_course=path_course)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
+
+        course = resolved.get('course')
+        if not ProfileCourse.objects.filter(course=course, profile=auth).exists():
+            return Response({'error': "Вы не поступили на этот курс"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CompleteStepBatchSerializer(data=request.data,
+                                                 context={'profile': auth, 'tree': resolved.get('tree')})
+        serializer.is_valid(raise_exception=True)
+        step_list = serializer.save()
+
+        return Response({
+            'message': "Вы успешно изучили шаги!",
+            'steps': [step.path for step, _ in step_list],
+        }, status=status.HTTP_200_OK)
+
     # ###########
 
     # COMPLETE COURSE
     @action(detail=False, methods=['post'])
     def start_learn_course(self, request, path):
-        exists = PathValidator.exists(path_course=path)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve(path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        course = Course.objects.get(path=path)
-        profile_course_list = ProfileCourse.objects.filter(course=course, profile=auth)
-        if len(profile_course_list) == 0:
-            profile_course = ProfileCourse.objects.create(course=course, profile=auth)
-        else:
-            profile_course = profile_course_list[0]
-        profile_course.status = ProfileCourseStatus.objects.get(name=Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
-        profile_course.save()
+        auth = self.request.profile
+        course = resolved.get('course')
+        status_studying = profile_course_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+        try:
+            with transaction.atomic():
+                profile_course = ProfileCourse.objects.filter(course=course, profile=auth).first()
+                if profile_course is None:
+                    profile_course = ProfileCourse.objects.create(course=course, profile=auth, status=status_studying)
+                else:
+                    CourseMembers.set_status(profile_course=profile_course, status=status_studying)
+        except IntegrityError:
+            # параллельный запрос успел записать на курс
+            return Response({'error': "Вы уже поступили на этот курс"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
             'profile': auth.user.username,
@@ -631,19 +679,19 @@ class CourseCompletionPageView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def complete_learn_course(self, request, path):
-        exists = PathValidator.exists(path_course=path)
-        if exists.get('error', None) is not None:
-            return exists.get('error')
+        resolved = PathValidator.resolve(path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        auth = Profile.objects.get(user=self.request.user)
-        course = Course.objects.get(path=path)
+        auth = self.request.profile
+        course = resolved.get('course')
         profile_course_list = ProfileCourse.objects.filter(course=course, profile=auth)
         if len(profile_course_list) == 0:
             return Response({'error': "Вы не поступили на этот курс, чтобы завершить его"},
                             status=status.HTTP_400_BAD_REQUEST)
         profile_course = profile_course_list[0]
-        profile_course.status = ProfileCourseStatus.objects.get(name=Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
-        profile_course.save()
+        CourseMembers.set_status(profile_course=profile_course,
+                                 status=profile_course_status_registry.get(Util.PROFILE_COURSE_STATUS_STUDIED_NAME))
 
         return Response({
             'profile': auth.user.username,
@@ -662,15 +710,17 @@ class ThemeView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_theme(self, request, path):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path)
+        course = resolved.get('course')
         number_new_theme = len(self.queryset.filter(course=course)) + 1
-        serializer = ActionThemeSerializer(data={'title': f"Тема #{number_new_theme}"}, context={'course': course})
+        serializer = ActionThemeSerializer(data={'title': f"Тема #{number_new_theme}"},
+                                           context={'course': course, 'number': number_new_theme})
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        CourseOutline.bump(pk=course.pk)
         return Response({
             'title': serializer.data['title'],
             'path': serializer.data['path'],
@@ -679,47 +729,69 @@ class ThemeView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def get_update_info(self, request, path_course, path_theme):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path_course)
-        theme = self.queryset.get(path=path_theme)
+        course = resolved.get('course')
+        theme = resolved.get('theme')
         serializer = ActionThemeSerializer(theme, context={'course': course})
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['put'])
     def update_theme(self, request, path_course, path_theme):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        course = Course.objects.get(path=path_course)
-        theme = self.queryset.get(path=path_theme)
+        course = resolved.get('course')
+        theme = resolved.get('theme')
         serializer = ActionThemeSerializer(data=request.data, instance=theme, context={'course': course})
         serializer.is_valid(raise_exception=True)
         try:
             serializer.save()
         except ValueError as ex:
             return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        CourseOutline.bump(path=path_course)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['delete'])
     def delete_theme(self, request, path_course, path_theme):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        theme = self.queryset.get(path=path_theme)
+        theme = resolved.get('theme')
         MaxProgressUpdater.update_max_progress(old=theme.max_progress, new=0, theme=theme)
         theme.delete()
+        ContentOrder.renumber(self.queryset.filter(course_id=theme.course_id))
+        CourseOutline.bump(path=path_course)
         return Response({
             'title': theme.title,
             'path': theme.path,
             'message': "Тема успешно удалена"
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['put'])
+    def reorder_themes(self, request, path):
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
+
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ContentOrder.reorder(self.queryset.filter(course=resolved.get('course')),
+                                 serializer.validated_data.get('paths'))
+        except ValueError as ex:
+            return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        CourseOutline.bump(pk=resolved.get('course').pk)
+        return Response({
+            'paths': serializer.validated_data.get('paths'),
+            'message': "Порядок тем изменен"
+        }, status=status.HTTP_200_OK)
+
 
 class LessonView(viewsets.ModelViewSet):
     """Тема"""
@@ -729,21 +801,21 @@ class LessonView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_lesson(self, request, path_course, path_theme):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        theme = Theme.objects.get(path=path_theme)
+        theme = resolved.get('theme')
         number_new_lesson = len(self.queryset.filter(theme=theme)) + 1
-        path_lesson = Util.get_max_path(self.queryset.filter(theme=theme)) + 1
-        serializer = ActionLessonSerializer(data={'title': f"Урок #{number_new_lesson}", 'path': path_lesson},
-                                            context={'theme': theme})
+        serializer = ActionLessonSerializer(data={'title': f"Урок #{number_new_lesson}"},
+                                            context={'theme': theme, 'number': number_new_lesson})
         serializer.is_valid(raise_exception=True)
         try:
             serializer.save()
         except ValueError as ex:
             return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
 
+        CourseOutline.bump(path=path_course)
         return Response({
             'title': serializer.data['title'],
             'path': serializer.data['path'],
@@ -752,48 +824,72 @@ class LessonView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def get_update_info(self, request, path_course, path_theme, path_lesson):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme,
-                                          path_lesson=path_lesson)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        theme = Theme.objects.get(path=path_theme)
-        lesson = self.queryset.get(path=path_lesson)
+        theme = resolved.get('theme')
+        lesson = resolved.get('lesson')
         serializer = ActionLessonSerializer(lesson, context={'theme': theme})
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['put'])
     def update_lesson(self, request, path_course, path_theme, path_lesson):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        theme = Theme.objects.get(path=path_theme)
-        lesson = self.queryset.get(path=path_lesson)
+        theme = resolved.get('theme')
+        lesson = resolved.get('lesson')
         serializer = ActionLessonSerializer(data=request.data, instance=lesson, context={'theme': theme})
         serializer.is_valid(raise_exception=True)
         try:
             serializer.save()
         except ValueError as ex:
             return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        CourseOutline.bump(path=path_course)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['delete'])
     def delete_lesson(self, request, path_course, path_theme, path_lesson):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        lesson = self.queryset.get(path=path_lesson)
+        lesson = resolved.get('lesson')
         MaxProgressUpdater.update_max_progress(old=lesson.max_progress, new=0, lesson=lesson)
         lesson.delete()
+        ContentOrder.renumber(self.queryset.filter(theme_id=lesson.theme_id))
+        CourseOutline.bump(path=path_course)
         return Response({
             'title': lesson.title,
             'path': lesson.path,
             'message': "Урок успешно удален"
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['put'])
+    def reorder_lessons(self, request, path_course, path_theme):
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
+
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ContentOrder.reorder(self.queryset.filter(theme=resolved.get('theme')),
+                                 serializer.validated_data.get('paths'))
+        except ValueError as ex:
+            return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        CourseOutline.bump(pk=resolved.get('course').pk)
+        return Response({
+            'paths': serializer.validated_data.get('paths'),
+            'message': "Порядок уроков изменен"
+        }, status=status.HTTP_200_OK)
+
 
 class StepView(viewsets.ModelViewSet):
     """Шаг"""
@@ -803,12 +899,12 @@ class StepView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def create_step(self, request, path_course, path_theme, path_lesson):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme,
-                                          path_lesson=path_lesson)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        lesson = Lesson.objects.get(path=path_lesson)
+        lesson = resolved.get('lesson')
         number_new_step = len(self.queryset.filter(lesson=lesson)) + 1
         serializer = ActionStepSerializer(data={'title': f"Шаг #{number_new_step}"},
                                           context={'lesson': lesson, 'number': number_new_step})
@@ -818,6 +914,7 @@ class StepView(viewsets.ModelViewSet):
         except ValueError as ex:
             return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
 
+        CourseOutline.bump(path=path_course)
         return Response({
             'title': serializer.data['title'],
             'path': serializer.data['path'],
@@ -826,47 +923,70 @@ class StepView(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def get_update_info(self, request, path_course, path_theme, path_lesson, path_step):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme,
-                                          path_lesson=path_lesson, path_step=path_step)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        lesson = Lesson.objects.get(path=path_lesson)
-        step = self.queryset.get(path=path_step)
-        serializer = StepSerializer(step, context={'lesson': lesson, 'request': request})
+        lesson = resolved.get('lesson')
+        step = resolved.get('step')
+        tree = CourseTreeLoader(course=resolved.get('course'))
+        serializer = StepSerializer(step, context={'lesson': lesson, 'request': request, 'tree': tree})
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['put'])
     def update_step(self, request, path_course, path_theme, path_lesson, path_step):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme,
-                                          path_lesson=path_lesson, path_step=path_step)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        step = self.queryset.get(path=path_step)
+        step = resolved.get('step')
         serializer = ActionStepSerializer(data=request.data, instance=step, context={'step': step})
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        CourseOutline.bump(path=path_course)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['delete'])
     def delete_step(self, request, path_course, path_theme, path_lesson, path_step):
-        is_valid = PathValidator.is_valid(user=self.request.user, path_course=path_course, path_theme=path_theme,
-                                          path_lesson=path_lesson, path_step=path_step)
-        if is_valid.get('error', None) is not None:
-            return is_valid.get('error')
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson, path_step=path_step)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
 
-        step = self.queryset.get(path=path_step)
+        step = resolved.get('step')
         MaxProgressUpdater.update_max_progress(old=step.max_progress, new=0, step=step)
         step.delete()
-        ActionStepSerializer.update_numbers(step_list=Step.objects.filter(lesson=step.lesson))
+        ActionStepSerializer.update_numbers(step_list=self.queryset.filter(lesson_id=step.lesson_id))
+        CourseOutline.bump(path=path_course)
         return Response({
             'title': step.title,
             'path': step.path,
             'message': "Шаг успешно удален"
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['put'])
+    def reorder_steps(self, request, path_course, path_theme, path_lesson):
+        resolved = PathValidator.resolve(user=self.request.user, path_course=path_course, path_theme=path_theme,
+                                         path_lesson=path_lesson)
+        if resolved.get('error', None) is not None:
+            return resolved.get('error')
+
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ContentOrder.reorder(self.queryset.filter(lesson=resolved.get('lesson')),
+                                 serializer.validated_data.get('paths'))
+        except ValueError as ex:
+            return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        CourseOutline.bump(pk=resolved.get('course').pk)
+        return Response({
+            'paths': serializer.validated_data.get('paths'),
+            'message': "Порядок шагов изменен"
+        }, status=status.HTTP_200_OK)
+
 
 # #########################################
 #    ######## ACTIONS PROFILE ########
@@ -899,7 +1019,7 @@ class ActionProfileCourseView(viewsets.ModelViewSet):
         if not self.exists_collection(path=collection_path):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         course = Course.objects.get(path=path)
         collection = Collection.objects.get(path=collection_path)
         if collection.profile != auth:
@@ -929,7 +1049,7 @@ class ActionProfileCourseView(viewsets.ModelViewSet):
         if not self.exists_collection(path=collection_path):
             return Response({'error': "Такой подборки не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         course = self.get_course(path=path)
         collection = Collection.objects.get(path=collection_path)
         if collection.profile != auth:
@@ -970,7 +1090,7 @@ class GradeCourseView(viewsets.ModelViewSet):
             return Response({'error': "Такого курса не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         course = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         serializer = GradeCourseSerializer(data=request.data, context={'profile': profile, 'course': course})
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -986,7 +1106,7 @@ class GradeCourseView(viewsets.ModelViewSet):
             return Response({'error': "Такого курса не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         course = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         profile_course = ProfileCourse.objects.get(profile=profile, course=course)
 
         serializer = GradeCourseSerializer(data=request.data, instance=profile_course)
@@ -1004,7 +1124,7 @@ class GradeCourseView(viewsets.ModelViewSet):
             return Response({'error': "Такого курса не существует"}, status=status.HTTP_404_NOT_FOUND)
 
         course = self.queryset.get(path=path)
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
 
         if course.profile != profile:
             return Response({"error": "У вас нет доступа для удаления оценки курса от имени этого аккаунта"},
@@ -1022,6 +1142,14 @@ class GradeCourseView(viewsets.ModelViewSet):
 
 
 class PathValidator:
+    LEVELS = ('course', 'theme', 'lesson', 'step')
+    LEVEL_MODELS = (Course, Theme, Lesson, Step)
+    LEVEL_ERRORS = (
+        "Такого курса не существует",
+        "Такой темы не существует",
+        "Такого урока не существует",
+        "Такого шага не существует",
+    )
 
     @staticmethod
     def get_exists(data, model, error_text):
@@ -1034,69 +1162,86 @@ class PathValidator:
         return {'valid': True}
 
     @staticmethod
-    def is_valid(user=None, path_course=None, path_theme=None, path_lesson=None, path_step=None):
-        exists = PathValidator.exists(path_course=path_course, path_theme=path_theme, path_lesson=path_lesson,
-                                      path_step=path_step)
-        if exists.get('error', None) is not None:
-            return exists
+    def get_lookups(paths, depth):
+        """Фильтр по path элемента уровня depth и всех его предков, например lesson__theme__course__path"""
+        lookups = dict()
+        for level in range(depth + 1):
+            relation = '__'.join(reversed(PathValidator.LEVELS[level:depth]))
+            lookups[f"{relation}__path" if relation else 'path'] = paths[level]
+        return lookups
 
-        if user is not None:
-            is_access = PathValidator.is_access(user=user, path_course=path_course)
-            if is_access.get('error', None) is not None:
-                return is_access
+    @staticmethod
+    def resolve(user=None, path_course=None, path_theme=None, path_lesson=None, path_step=None):
+        """
+        Курс, тема, урок и шаг одним запросом с JOIN, с проверкой вложенности.
+        Если передан user, проверяет, что он автор курса
+        """
+        paths = (path_course, path_theme, path_lesson, path_step)
+        depth = max(level for level, path in enumerate(paths) if path is not None)
+        relation = '__'.join(reversed(PathValidator.LEVELS[:depth]))
+        queryset = PathValidator.LEVEL_MODELS[depth].objects \
+            .select_related(f"{relation}__profile" if relation else 'profile') \
+            .filter(**PathValidator.get_lookups(paths, depth))
+
+        item = queryset.first()
+        if item is None:
+            return PathValidator.get_not_found_level(paths, depth)
+
+        resolved = {'valid': True}
+        for level in range(depth, -1, -1):
+            resolved[PathValidator.LEVELS[level]] = item
+            if level != 0:
+                item = getattr(item, PathValidator.LEVELS[level - 1])
+
+        if (user is not None) and (resolved.get('course').profile.user_id != user.pk):
+            error_text = "У вас нет доступа для создания/изменения/удаления шага от имени этого аккаунта"
+            return {
+                'valid': False,
+                'error': Response({'error': error_text}, status=status.HTTP_404_NOT_FOUND),
+            }
+        return resolved
 
-        return {'valid': True}
+    @staticmethod
+    def get_not_found_level(paths, depth):
+        """Ошибка для первого несуществующего элемента пути, только когда resolve ничего не нашел"""
+        for level in range(depth + 1):
+            model = PathValidator.LEVEL_MODELS[level]
+            if not model.objects.filter(**PathValidator.get_lookups(paths, level)).exists():
+                return PathValidator.get_not_found(PathValidator.LEVEL_ERRORS[level])
+        return PathValidator.get_not_found(PathValidator.LEVEL_ERRORS[depth])
+
+    @staticmethod
+    def get_not_found(error_text):
+        return {
+            'valid': False,
+            'error': Response({'error': error_text}, status=status.HTTP_404_NOT_FOUND),
+        }
 
     @staticmethod
-    def exists(path_course=None, path_theme=None, path_lesson=None, path_step=None):
-        if path_course is not None:
-            exists_course = PathValidator.exists_course(path_course=path_course)
-            if exists_course.get('error', None) is not None:
-                return exists_course
+    def resolve_tree(profile=None, path_course=None, path_theme=None, path_lesson=None, path_step=None):
+        """
+        Находит курс и его темы/уроки/шаги по CourseOutline, не обращаясь к таблицам контента.
+        Проверяет, что каждый элемент пути вложен в предыдущий
+        """
+        course = Course.objects.filter(path=path_course).first()
+        if course is None:
+            return PathValidator.get_not_found("Такого курса не существует")
+        tree = CourseTreeLoader(course=course, profile=profile)
+        resolved = {'valid': True, 'course': course, 'tree': tree}
 
         if path_theme is not None:
-            exists_theme = PathValidator.exists_theme(path_theme=path_theme)
-            if exists_theme.get('error', None) is not None:
-                return exists_theme
+            resolved['theme'] = tree.find_theme(path_theme)
+            if resolved.get('theme') is None:
+                return PathValidator.get_not_found("Такой темы не существует")
 
         if path_lesson is not None:
-            exists_lesson = PathValidator.exists_lesson(path_lesson=path_lesson)
-            if exists_lesson.get('error', None) is not None:
-                return exists_lesson
+            resolved['lesson'] = tree.find_lesson(resolved.get('theme'), path_lesson)
+            if resolved.get('lesson') is None:
+                return PathValidator.get_not_found("Такого урока не существует")
 
         if path_step is not None:
-            exists_step = PathValidator.exists_step(path_step=path_step)
-            if exists_step.get('error', None) is not None:
-                return exists_step
-
-        return {'valid': True}
-
-    @staticmethod
-    def exists_course(path_course):
-        return PathValidator.get_exists(data={'path': path_course}, model=Course,
-                                        error_text="Такого курса не существует")
+            resolved['step'] = tree.find_step(resolved.get('lesson'), path_step)
+            if resolved.get('step') is None:
+                return PathValidator.get_not_found("Такого шага не существует")
 
-    @staticmethod
-    def exists_theme(path_theme):
-        return PathValidator.get_exists(data={'path': path_theme}, model=Theme, error_text="Такой темы не существует")
-
-    @staticmethod
-    def exists_lesson(path_lesson):
-        return PathValidator.get_exists(data={'path': path_lesson}, model=Lesson,
-                                        error_text="Такого урока не существует")
-
-    @staticmethod
-    def exists_step(path_step):
-        return PathValidator.get_exists(data={'path': path_step}, model=Step, error_text="Такого шага не существует")
-
-    @staticmethod
-    def is_access(user, path_course):
-        auth = Profile.objects.get(user=user)
-        course = Course.objects.get(path=path_course)
-        if course.profile != auth:
-            error_text = "У вас нет доступа для создания/изменения/удаления шага от имени этого аккаунта"
-            return {
-                'valid': False,
-                'error': Response({'error': error_text}, status=status.HTTP_404_NOT_FOUND),
-            }
-        return {'valid': False}
+        return resolved
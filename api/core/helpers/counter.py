@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Count
+
+
+class TableCounter:
+    """
+    Cached COUNT(*) of a whole table for unfiltered paginated lists.
+    The value is counted once and then kept current by post_save/post_delete signals (increment/decrement).
+    Changes that bypass signals (bulk_create, rolled back transactions) are corrected after CACHE_TIMEOUT.
+    """
+    CACHE_TIMEOUT = 60 * 60
+
+    registry = dict()
+
+    def __init__(self, model):
+        self.model = model
+        self.key = f"table-count:{model._meta.label_lower}"
+        TableCounter.registry[model] = self
+
+    @staticmethod
+    def get_counter(model):
+        return TableCounter.registry.get(model, None)
+
+    def get(self):
+        count = cache.get(self.key)
+        if count is None:
+            count = self.model._default_manager.count()
+            cache.set(self.key, count, self.CACHE_TIMEOUT)
+        return max(count, 0)
+
+    def add(self, delta):
+        try:
+            cache.incr(self.key, delta)
+        except ValueError:
+            # еще не посчитано - посчитается при первом get()
+            pass
+
+    def increment(self, sender=None, **kwargs):
+        if kwargs.get('created', False):
+            self.add(1)
+
+    def decrement(self, sender=None, **kwargs):
+        self.add(-1)
+
+    def invalidate(self, sender=None, **kwargs):
+        cache.delete(self.key)
+
+
+class LinkCounter:
+    """
+    Denormalized amounts of link rows (Subscription, ProfileCollection) stored on the linked objects.
+    counters is a tuple of (model, link_field, counter_field): model.counter_field of the row link.link_field
+    points to is changed with F() in the same transaction as the link row itself.
+    """
+    BATCH_SIZE = 500
+
+    def __init__(self, link_model, counters):
+        self.link_model = link_model
+        self.counters = counters
+
+    def apply(self, values, delta):
+        for model, link_field, counter_field in self.counters:
+            model.objects.filter(pk=values[link_field]).update(**{counter_field: F(counter_field) + delta})
+
+    def add(self, **fields):
+        with transaction.atomic():
+            link = self.link_model.objects.create(**fields)
+            self.apply({link_field: getattr(link, link_field) for _, link_field, _ in self.counters}, 1)
+        return link
+
+    def remove(self, **lookup):
+        """lookup must contain every link_field; counters change only by the rows this call really deleted"""
+        with transaction.atomic():
+            deleted, deleted_dict = self.link_model.objects.filter(**lookup).delete()
+            deleted = deleted_dict.get(self.link_model._meta.label, 0)
+            if deleted != 0:
+                self.apply(lookup, -deleted)
+
+    def recount(self):
+        """Fixes drift left by changes that bypass add/remove (cascade deletes), returns the number of fixed rows"""
+        recounted = 0
+        for model in dict.fromkeys(model for model, _, _ in self.counters):
+            counters = [(link_field, counter_field) for counter_model, link_field, counter_field in self.counters
+                        if counter_model is model]
+            field_names = [counter_field for _, counter_field in counters]
+            actual = [dict(self.link_model.objects.order_by().values_list(link_field).annotate(amount=Count('pk')))
+                      for link_field, _ in counters]
+
+            row_list = list()
+            for pk, *stored in model.objects.values_list('pk', *field_names):
+                amounts = [amount.get(pk, 0) for amount in actual]
+                if amounts != stored:
+                    row_list.append(model(pk=pk, **dict(zip(field_names, amounts))))
+            model.objects.bulk_update(row_list, field_names, batch_size=self.BATCH_SIZE)
+            recounted += len(row_list)
+        return recounted
@@ -7,4 +7,23 @@ class TrackingModel(models.Model):
 
     class Meta:
         abstract = True
-        ordering = ('-created_at',)
\ No newline at end of file
+        ordering = ('-created_at',)
+
+
+class CounterModel(models.Model):
+    """
+    Model with counter fields that are changed only by F() increments.
+    A full save() of an existing row does not write them back,
+    so a stale instance can not overwrite a concurrent increment.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.counter_fields and (not self._state.adding) and (kwargs.get('update_fields') is None) \
+                and (not kwargs.get('force_insert', False)):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if (not field.primary_key) and (field.name not in self.counter_fields)]
+        super().save(*args, **kwargs)
@@ -0,0 +1,37 @@
+class LookupRegistry:
+    """
+    Process-local cache of a small lookup table (statuses, roles).
+    Rows are loaded once, indexed by name and pk, and reloaded after invalidate().
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.by_name = None
+        self.by_pk = None
+
+    def load(self):
+        by_name = dict()
+        by_pk = dict()
+        for item in self.model.objects.all():
+            by_name.setdefault(item.name, item)
+            by_pk[item.pk] = item
+        self.by_name, self.by_pk = by_name, by_pk
+
+    def invalidate(self, sender=None, **kwargs):
+        self.by_name, self.by_pk = None, None
+
+    def get(self, name):
+        if self.by_name is None:
+            self.load()
+        item = self.by_name.get(name, None)
+        if item is None:
+            raise self.model.DoesNotExist(f"{self.model.__name__} \"{name}\" does not exist")
+        return item
+
+    def get_pk(self, name):
+        return self.get(name).pk
+
+    def get_by_pk(self, pk):
+        if self.by_pk is None:
+            self.load()
+        return self.by_pk.get(pk, None)
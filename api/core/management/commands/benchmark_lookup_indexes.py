@@ -0,0 +1,147 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+from ...collection.models_collection import Collection, ProfileCollection
+from ...course.models_course import Course, Theme, Lesson, Step, ProfileCourse, ProfileTheme, ProfileLesson, \
+    ProfileStep, ProfileCourseCollection, ProfileActionsLogs
+from ...models import User
+from ...profile.models_profile import Profile, Subscription
+
+
+class Command(BaseCommand):
+    help = "План и время горячих выборок до миграций с составными/unique индексами и после них " \
+           "на заполненной тестовой базе (рабочая база не используется)"
+
+    MIGRATION_BEFORE = ('core', '0006_search_term')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=300)
+        parser.add_argument('--courses', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=200, help="Повторов каждой выборки для замера времени")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # данные создаются текущими моделями на последней схеме, затем схема откатывается до индексов
+            self.migrate(self.get_latest())
+            sample = self.seed(options['profiles'], options['courses'])
+            self.migrate(self.MIGRATION_BEFORE)
+            before = self.measure(sample, options['repeat'])
+            self.migrate(self.get_latest())
+            after = self.measure(sample, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name in before:
+            (plan_before, time_before), (plan_after, time_after) = before[name], after[name]
+            self.stdout.write(f"{name}: {time_before:.1f} -> {time_after:.1f} us")
+            self.stdout.write(f"    before: {plan_before}")
+            self.stdout.write(f"    after:  {plan_after}")
+
+    @staticmethod
+    def get_latest():
+        executor = MigrationExecutor(connection)
+        return max(node for node in executor.loader.graph.leaf_nodes() if node[0] == 'core')
+
+    @staticmethod
+    def migrate(target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+
+    @staticmethod
+    def seed(profile_amount, course_amount):
+        """Профили, курсы (5 тем x 4 урока x 5 шагов), подписки, подборки и прохождение курсов"""
+        User.objects.bulk_create([
+            User(username=f"benchmark-{i}", email=f"benchmark-{i}@benchmark.local") for i in range(profile_amount)
+        ])
+        user_list = User.objects.filter(username__startswith='benchmark-')
+        profile_list = Profile.objects.bulk_create([
+            Profile(user=user, path=f"benchmark-{user.pk}") for user in user_list
+        ])
+        course_list = Course.objects.bulk_create([
+            Course(title=f"Benchmark #{i}", profile=profile_list[i % profile_amount], path=f"benchmark-{i}")
+            for i in range(course_amount)
+        ])
+        theme_list = Theme.objects.bulk_create([
+            Theme(course=course, title=f"Theme #{i}", path=str(i)) for course in course_list for i in range(1, 6)
+        ])
+        lesson_list = Lesson.objects.bulk_create([
+            Lesson(theme=theme, title=f"Lesson #{i}", path=str(i)) for theme in theme_list for i in range(1, 5)
+        ])
+        step_list = Step.objects.bulk_create([
+            Step(lesson=lesson, title=f"Step #{i}", path=str(i), number=i)
+            for lesson in lesson_list for i in range(1, 6)
+        ])
+        collection_list = Collection.objects.bulk_create([
+            Collection(title=f"Benchmark #{i}", profile=profile, path=f"benchmark-{i}")
+            for i, profile in enumerate(profile_list)
+        ])
+
+        now = timezone.now()
+        steps_in_course = len(step_list) // course_amount
+        profile_course_list, profile_step_list, log_list = list(), list(), list()
+        profile_collection_list, profile_course_collection_list, subscription_list = list(), list(), list()
+        for i, profile in enumerate(profile_list):
+            for j in range(3):
+                course = course_list[(i + j) % course_amount]
+                profile_course_list.append(ProfileCourse(profile=profile, course=course))
+                profile_course_collection_list.append(ProfileCourseCollection(profile=profile, course=course))
+            course_index = i % course_amount
+            for step in step_list[course_index * steps_in_course:(course_index + 1) * steps_in_course]:
+                profile_step_list.append(ProfileStep(profile=profile, step=step))
+                log_list.append(ProfileActionsLogs(profile=profile, step=step, date_action=now))
+            for j in range(1, 6):
+                goal = profile_list[(i + j) % profile_amount]
+                subscription_list.append(Subscription(goal=goal, subscriber=profile))
+                profile_collection_list.append(
+                    ProfileCollection(profile=profile, collection=collection_list[(i + j) % profile_amount]))
+        ProfileCourse.objects.bulk_create(profile_course_list)
+        ProfileCourseCollection.objects.bulk_create(profile_course_collection_list)
+        ProfileStep.objects.bulk_create(profile_step_list)
+        ProfileActionsLogs.objects.bulk_create(log_list)
+        Subscription.objects.bulk_create(subscription_list)
+        ProfileCollection.objects.bulk_create(profile_collection_list)
+        ProfileTheme.objects.bulk_create([ProfileTheme(profile=profile, theme=theme_list[0]) for profile in profile_list])
+        ProfileLesson.objects.bulk_create([ProfileLesson(profile=profile, lesson=lesson_list[0])
+                                           for profile in profile_list])
+
+        profile, goal = profile_list[-1], profile_list[0]
+        course = course_list[(profile_amount - 1) % course_amount]
+        theme = Theme.objects.filter(course=course).last()
+        lesson = Lesson.objects.filter(theme=theme).last()
+        step = Step.objects.filter(lesson=lesson).last()
+        return {
+            'ProfileCourse(profile, course)': ProfileCourse.objects.filter(profile=profile, course=course),
+            'ProfileStep(profile, step)': ProfileStep.objects.filter(profile=profile, step=step),
+            'ProfileTheme(profile, theme)': ProfileTheme.objects.filter(profile=profile, theme=theme_list[0]),
+            'ProfileLesson(profile, lesson)': ProfileLesson.objects.filter(profile=profile, lesson=lesson_list[0]),
+            'Subscription(goal, subscriber)': Subscription.objects.filter(goal=goal, subscriber=profile),
+            'ProfileCollection(profile, collection)':
+                ProfileCollection.objects.filter(profile=profile, collection=collection_list[0]),
+            'ProfileCourseCollection(profile, course, collection)':
+                ProfileCourseCollection.objects.filter(profile=profile, course=course, collection=None),
+            'ProfileActionsLogs(profile, step)': ProfileActionsLogs.objects.filter(profile=profile, step=step),
+            'Profile.path': Profile.objects.filter(path=profile.path),
+            'Theme(course, path)': Theme.objects.filter(course=course, path=theme.path),
+            'Lesson(theme, path)': Lesson.objects.filter(theme=theme, path=lesson.path),
+            'Step(lesson, path)': Step.objects.filter(lesson=lesson, path=step.path),
+        }
+
+    @staticmethod
+    def measure(sample, repeat):
+        """{название: (план, мкс на выборку)}; выбирается только pk, потому что откатанная схема уже моделей"""
+        result = dict()
+        for name, queryset in sample.items():
+            queryset = queryset.values_list('pk')
+            plan = ' | '.join(line.strip() for line in queryset.explain().splitlines())
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            result[name] = (plan, (time.perf_counter() - start) / repeat * 1000000)
+        return result
@@ -0,0 +1,79 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ...auth.middleware_auth import ProfileMiddleware
+from ...collection.models_collection import Collection, ProfileCollection
+from ...collection.views_collection import CollectionView
+from ...course.models_course import Course, ProfileCourse
+from ...course.views_course import CourseView
+from ...models import User
+from ...profile.models_profile import Profile
+
+
+class Command(BaseCommand):
+    help = "Память и число запросов списков профиля (добавленные/все курсы, добавленные подборки) " \
+           "при росте числа элементов. Данные создаются в транзакции и откатываются"
+
+    ENDPOINTS = (
+        ('added courses', CourseView, 'get_added_courses'),
+        ('all profile courses', CourseView, 'get_all_profile_courses'),
+        ('added collections', CollectionView, 'get_added_collections'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 5000],
+                            help="Количество добавленных курсов и подборок у профиля")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'endpoint':<22}{'items':>8}{'queries':>9}{'peak KiB':>10}{'ms':>8}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                viewer = self.create_fixtures(size)
+                for name, view_class, action_name in self.ENDPOINTS:
+                    queries, peak, duration = self.measure(view_class, action_name, viewer)
+                    self.stdout.write(f"{name:<22}{size:>8}{queries:>9}{peak / 1024:>10.0f}{duration * 1000:>8.0f}")
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def create_profile(username):
+        user = User.objects.create_user(username=username, email=f"{username}@benchmark.local", password=None)
+        return Profile.objects.get(user=user)
+
+    def create_fixtures(self, size):
+        author = self.create_profile('benchmark-author')
+        viewer = self.create_profile('benchmark-viewer')
+
+        course_list = Course.objects.bulk_create([
+            Course(title=f"Benchmark #{i}", profile=author, path=f"benchmark-{i}") for i in range(size)
+        ])
+        ProfileCourse.objects.bulk_create([ProfileCourse(profile=viewer, course=course) for course in course_list])
+
+        collection_list = Collection.objects.bulk_create([
+            Collection(title=f"Benchmark #{i}", profile=author, path=f"benchmark-{i}") for i in range(size)
+        ])
+        ProfileCollection.objects.bulk_create([
+            ProfileCollection(profile=viewer, collection=collection) for collection in collection_list
+        ])
+        return viewer
+
+    @staticmethod
+    def measure(view_class, action_name, viewer):
+        view = view_class.as_view({'get': action_name})
+        request = APIRequestFactory().get('/', HTTP_HOST='localhost')
+        force_authenticate(request, user=viewer.user)
+        handler = ProfileMiddleware(lambda r: view(r, path=viewer.path))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            response = handler(request)
+            response.render()
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return len(context.captured_queries), peak, duration
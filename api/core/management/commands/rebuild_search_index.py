@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...search.models_search import SearchIndex, SearchTerm
+
+
+class Command(BaseCommand):
+    help = "Полная пересборка поискового индекса (SearchTerm) курсов, подборок и профилей"
+
+    def handle(self, *args, **options):
+        SearchIndex.rebuild()
+        self.stdout.write(f"Search terms: {SearchTerm.objects.count()}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...collection.models_collection import CollectionMembers
+
+
+class Command(BaseCommand):
+    help = "Исправляет members_amount подборок, у которых ProfileCollection удалялись вместе с профилем"
+
+    def handle(self, *args, **options):
+        recounted = CollectionMembers.recount()
+        self.stdout.write(f"Recounted collections: {recounted}")
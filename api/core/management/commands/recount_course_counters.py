@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...course.models_course import CourseMembers
+
+
+class Command(BaseCommand):
+    help = "Пересчет счетчиков курсов (members_amount, studying_amount, completed_amount) и каталога по ProfileCourse"
+
+    def handle(self, *args, **options):
+        recounted = CourseMembers.recount()
+        self.stdout.write(f"Recounted courses: {recounted}")
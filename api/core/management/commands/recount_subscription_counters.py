@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...profile.models_profile import ProfileSubscriptions
+
+
+class Command(BaseCommand):
+    help = "Исправляет followers_count/following_count профилей, сбитые каскадным удалением подписок"
+
+    def handle(self, *args, **options):
+        recounted = ProfileSubscriptions.recount()
+        self.stdout.write(f"Recounted profiles: {recounted}")
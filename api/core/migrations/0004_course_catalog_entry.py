@@ -0,0 +1,67 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+COURSE_STATUS_RELEASE_NAME = 'Опубликован'
+
+
+def fill_course_catalog(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    CourseCatalogEntry = apps.get_model('core', 'CourseCatalogEntry')
+    course_list = Course.objects.filter(status__name=COURSE_STATUS_RELEASE_NAME).select_related('profile__user')
+    CourseCatalogEntry.objects.bulk_create([
+        CourseCatalogEntry(course=course, path=course.path, title=course.title, description=course.description,
+                           author=course.profile.user.username, image_url=course.image_url,
+                           duration_in_minutes=course.duration_in_minutes, rating=course.rating,
+                           members_amount=course.members_amount, max_progress=course.max_progress,
+                           ordering_key=course.pk)
+        for course in course_list
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_course_progress_lesson_progress_theme_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseCatalogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=64)),
+                ('title', models.CharField(max_length=64)),
+                ('description', models.TextField(blank=True, max_length=175)),
+                ('author', models.CharField(max_length=150)),
+                ('image_url', models.ImageField(blank=True, null=True, upload_to='')),
+                ('duration_in_minutes', models.IntegerField(default=0)),
+                ('rating', models.FloatField(default=0)),
+                ('members_amount', models.IntegerField(default=0)),
+                ('max_progress', models.IntegerField(default=0)),
+                ('ordering_key', models.BigIntegerField(default=0)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='core.course')),
+            ],
+            options={
+                'ordering': ('ordering_key',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='coursecatalogentry',
+            index=models.Index(fields=['ordering_key'], name='core_course_orderin_54e023_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursecatalogentry',
+            index=models.Index(fields=['rating', 'ordering_key'], name='core_course_rating_7f2ec7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursecatalogentry',
+            index=models.Index(fields=['title'], name='core_course_title_8a41b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursecatalogentry',
+            index=models.Index(fields=['author'], name='core_course_author_eeefd4_idx'),
+        ),
+        migrations.RunPython(fill_course_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_course_catalog_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+UNIQUE_FIELDS = (
+    ('ProfileCourse', ('profile', 'course')),
+    ('ProfileTheme', ('profile', 'theme')),
+    ('ProfileLesson', ('profile', 'lesson')),
+    ('ProfileStep', ('profile', 'step')),
+    ('ProfileCollection', ('profile', 'collection')),
+    ('ProfileCourseCollection', ('profile', 'course', 'collection')),
+    ('Subscription', ('goal', 'subscriber')),
+)
+
+
+# заполняются в оставшейся строке из удаляемых дублей, если в ней пустые
+MERGE_FIELDS = ('status_id', 'grade')
+
+
+def merge_duplicate(keeper, others, field_names):
+    """Пустые status/grade оставшейся строки берутся из дублей, date_added - самая ранняя"""
+    update_fields = list()
+    for name in MERGE_FIELDS:
+        if (name in field_names) and (getattr(keeper, name) is None):
+            values = [getattr(row, name) for row in others if getattr(row, name) is not None]
+            if len(values) != 0:
+                setattr(keeper, name, values[0])
+                update_fields.append(name)
+    if 'date_added' in field_names:
+        dates = [row.date_added for row in [keeper] + others if row.date_added is not None]
+        if (len(dates) != 0) and (min(dates) != keeper.date_added):
+            keeper.date_added = min(dates)
+            update_fields.append('date_added')
+    if len(update_fields) != 0:
+        keeper.save(update_fields=update_fields)
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Перед unique ограничениями: из дублей остается строка с наибольшим progress (при равенстве - с меньшим pk),
+    чтобы не потерять прогресс и оценки; дубли path профилей заменяются на pk
+    """
+    for model_name, fields in UNIQUE_FIELDS:
+        model = apps.get_model('core', model_name)
+        field_names = {field.attname for field in model._meta.concrete_fields}
+        ordering = ('-progress', 'pk') if 'progress' in field_names else ('pk',)
+        duplicates = model.objects.values(*fields).annotate(amount=Count('pk')).filter(amount__gt=1)
+        for duplicate in duplicates:
+            lookup = {field: duplicate[field] for field in fields}
+            keeper, *others = model.objects.filter(**lookup).order_by(*ordering)
+            merge_duplicate(keeper, others, field_names)
+            model.objects.filter(pk__in=[row.pk for row in others]).delete()
+
+    Profile = apps.get_model('core', 'Profile')
+    duplicates = Profile.objects.values('path').annotate(first=Min('pk'), amount=Count('pk')).filter(amount__gt=1)
+    for duplicate in duplicates:
+        for profile in Profile.objects.filter(path=duplicate['path']).exclude(pk=duplicate['first']):
+            profile.path = profile.pk
+            profile.save(update_fields=['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_term'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='profile',
+            name='path',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='profileactionslogs',
+            index=models.Index(fields=['profile', 'step', 'date_action'], name='core_profil_profile_15f6ac_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilecollection',
+            constraint=models.UniqueConstraint(fields=('profile', 'collection'), name='unique_profile_collection'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilecourse',
+            constraint=models.UniqueConstraint(fields=('profile', 'course'), name='unique_profile_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilecoursecollection',
+            constraint=models.UniqueConstraint(fields=('profile', 'course', 'collection'), name='unique_profile_course_collection'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilecoursecollection',
+            constraint=models.UniqueConstraint(condition=models.Q(('collection__isnull', True)), fields=('profile', 'course'), name='unique_profile_course_added'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilelesson',
+            constraint=models.UniqueConstraint(fields=('profile', 'lesson'), name='unique_profile_lesson'),
+        ),
+        migrations.AddConstraint(
+            model_name='profilestep',
+            constraint=models.UniqueConstraint(fields=('profile', 'step'), name='unique_profile_step'),
+        ),
+        migrations.AddConstraint(
+            model_name='profiletheme',
+            constraint=models.UniqueConstraint(fields=('profile', 'theme'), name='unique_profile_theme'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('goal', 'subscriber'), name='unique_subscription'),
+        ),
+    ]
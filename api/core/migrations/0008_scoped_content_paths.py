@@ -0,0 +1,47 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+SCOPED_PATHS = (
+    ('Theme', 'course'),
+    ('Lesson', 'theme'),
+    ('Step', 'lesson'),
+)
+
+
+def rename_duplicate_paths(apps, schema_editor):
+    """Перед unique (родитель, path): у дублей, кроме первого, path заменяется на pk, как при создании"""
+    for model_name, parent in SCOPED_PATHS:
+        model = apps.get_model('core', model_name)
+        duplicates = model.objects.exclude(path=None).values(parent, 'path') \
+            .annotate(first=Min('pk'), amount=Count('pk')).filter(amount__gt=1)
+        for duplicate in duplicates:
+            queryset = model.objects.filter(**{parent: duplicate[parent], 'path': duplicate['path']}) \
+                .exclude(pk=duplicate['first'])
+            for item in queryset:
+                item.path = item.pk
+                item.save(update_fields=['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_paths, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('theme', 'path'), name='unique_lesson_path'),
+        ),
+        migrations.AddConstraint(
+            model_name='step',
+            constraint=models.UniqueConstraint(fields=('lesson', 'path'), name='unique_step_path'),
+        ),
+        migrations.AddConstraint(
+            model_name='theme',
+            constraint=models.UniqueConstraint(fields=('course', 'path'), name='unique_theme_path'),
+        ),
+    ]
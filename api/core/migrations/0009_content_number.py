@@ -0,0 +1,38 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+NUMBERED_CONTENT = (('Theme', 'course_id'), ('Lesson', 'theme_id'))
+
+
+def fill_numbers(apps, schema_editor):
+    """Номера 1..n в пределах родителя в порядке создания (pk), как раньше выводились темы и уроки"""
+    for model_name, parent in NUMBERED_CONTENT:
+        model = apps.get_model('core', model_name)
+        changed = list()
+        numbers = dict()
+        for item in model.objects.order_by(parent, 'pk').only('pk', parent, 'number'):
+            item.number = numbers[getattr(item, parent)] = numbers.get(getattr(item, parent), 0) + 1
+            changed.append(item)
+        model.objects.bulk_update(changed, ['number'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_scoped_content_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='theme',
+            name='number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_current_step(apps, schema_editor):
+    """Указатель из журнала: последний по date_action шаг урока у каждого профиля"""
+    ProfileLesson = apps.get_model('core', 'ProfileLesson')
+    ProfileActionsLogs = apps.get_model('core', 'ProfileActionsLogs')
+    current_steps = dict()
+    logs = ProfileActionsLogs.objects.exclude(profile=None).exclude(step=None).order_by('date_action', 'pk') \
+        .values_list('profile_id', 'step__lesson_id', 'step_id')
+    for profile_id, lesson_id, step_id in logs.iterator():
+        current_steps[(profile_id, lesson_id)] = step_id
+
+    changed = list()
+    for profile_lesson in ProfileLesson.objects.only('pk', 'profile_id', 'lesson_id', 'current_step_id'):
+        step_id = current_steps.pop((profile_lesson.profile_id, profile_lesson.lesson_id), None)
+        if step_id is not None:
+            profile_lesson.current_step_id = step_id
+            changed.append(profile_lesson)
+    ProfileLesson.objects.bulk_update(changed, ['current_step'], batch_size=500)
+    ProfileLesson.objects.bulk_create([
+        ProfileLesson(profile_id=profile_id, lesson_id=lesson_id, current_step_id=step_id)
+        for (profile_id, lesson_id), step_id in current_steps.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_content_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilelesson',
+            name='current_step',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.step'),
+        ),
+        migrations.RunPython(fill_current_step, migrations.RunPython.noop),
+    ]
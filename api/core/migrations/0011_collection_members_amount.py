@@ -0,0 +1,24 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:41
+
+from django.db import migrations
+from django.db.models import Count, F
+
+
+def fill_members_amount(apps, schema_editor):
+    """members_amount раньше не обновлялся: заполняется количеством ProfileCollection"""
+    Collection = apps.get_model('core', 'Collection')
+    drifted = Collection.objects.annotate(actual_amount=Count('profilecollection')) \
+        .exclude(members_amount=F('actual_amount')).values_list('pk', 'actual_amount')
+    collection_list = [Collection(pk=pk, members_amount=actual_amount) for pk, actual_amount in drifted]
+    Collection.objects.bulk_update(collection_list, ['members_amount'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_profile_lesson_current_step'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_members_amount, migrations.RunPython.noop),
+    ]
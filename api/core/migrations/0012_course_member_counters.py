@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+
+# Util.PROFILE_COURSE_STATUS_STUDYING_NAME, Util.PROFILE_COURSE_STATUS_STUDIED_NAME
+STATUS_FIELDS = (('Изучается', 'studying_amount'), ('Завершен', 'completed_amount'))
+
+
+def fill_counters(apps, schema_editor):
+    """members_amount раньше не обновлялся: все счетчики заполняются по ProfileCourse"""
+    Course = apps.get_model('core', 'Course')
+    CourseCatalogEntry = apps.get_model('core', 'CourseCatalogEntry')
+    ProfileCourse = apps.get_model('core', 'ProfileCourse')
+
+    aggregates = {field: Count('pk', filter=Q(status__name=name)) for name, field in STATUS_FIELDS}
+    course_list = list()
+    for row in ProfileCourse.objects.order_by().values('course_id').annotate(members_amount=Count('pk'), **aggregates):
+        course_list.append(Course(pk=row.pop('course_id'), **row))
+    field_names = ['members_amount', *[field for name, field in STATUS_FIELDS]]
+    Course.objects.bulk_update(course_list, field_names, batch_size=500)
+
+    CourseCatalogEntry.objects.update(
+        members_amount=Subquery(Course.objects.filter(pk=OuterRef('course_id')).values('members_amount')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_collection_members_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='completed_amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='studying_amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    """Счетчики подписок по существующим Subscription"""
+    Profile = apps.get_model('core', 'Profile')
+    Subscription = apps.get_model('core', 'Subscription')
+    followers = dict(Subscription.objects.order_by().values_list('goal_id').annotate(amount=Count('pk')))
+    following = dict(Subscription.objects.order_by().values_list('subscriber_id').annotate(amount=Count('pk')))
+    profile_list = [Profile(pk=pk, followers_count=followers.get(pk, 0), following_count=following.get(pk, 0))
+                    for pk in set(followers) | set(following)]
+    Profile.objects.bulk_update(profile_list, ['followers_count', 'following_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_course_member_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,24 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
+from ..helpers.counter import TableCounter, LinkCounter
+from ..helpers.model import CounterModel
 from ..utils import Util
 from ..models import User
 
 
-class Profile(models.Model):
+class Profile(CounterModel):
     """Advanced User"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     description = models.TextField(blank=True, null=True)
-    path = models.CharField(max_length=64)
+    path = models.CharField(max_length=64, unique=True)
     avatar_url = models.ImageField(default=Util.DEFAULT_IMAGES.get('profile'))
     wrapper_url = models.ImageField(blank=True)
     is_verified = models.BooleanField(default=False)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+
+    counter_fields = ('followers_count', 'following_count')
 
     def __str__(self):
         return f'{self.user}'
@@ -28,6 +34,10 @@ def create_profile(sender, **kwargs):
 
 post_save.connect(create_profile, sender=User)
 
+profile_counter = TableCounter(Profile)
+post_save.connect(profile_counter.increment, sender=Profile)
+post_delete.connect(profile_counter.decrement, sender=Profile)
+
 
 class Subscription(models.Model):
     """
@@ -37,5 +47,34 @@ class Subscription(models.Model):
     goal = models.ForeignKey(Profile, related_name="goal", on_delete=models.CASCADE)
     subscriber = models.ForeignKey(Profile, related_name="subscriber", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['goal', 'subscriber'], name='unique_subscription'),
+        ]
+
     def __str__(self):
         return f'{self.subscriber.user.username} => {self.goal.user.username}'
+
+
+class ProfileSubscriptions:
+    """
+    Profile.followers_count (сколько профилей подписано на него) и Profile.following_count (на сколько подписан он).
+    Подписки профиля удаляются каскадом вместе с ним мимо unsubscribe - их сверяет recount_subscription_counters
+    """
+    counter = LinkCounter(Subscription, (
+        (Profile, 'goal_id', 'followers_count'),
+        (Profile, 'subscriber_id', 'following_count'),
+    ))
+
+    @staticmethod
+    def subscribe(goal, subscriber):
+        return ProfileSubscriptions.counter.add(goal=goal, subscriber=subscriber)
+
+    @staticmethod
+    def unsubscribe(goal, subscriber):
+        """Повторная отписка ничего не удалит и не уменьшит счетчики второй раз"""
+        ProfileSubscriptions.counter.remove(goal_id=goal.pk, subscriber_id=subscriber.pk)
+
+    @staticmethod
+    def recount():
+        return ProfileSubscriptions.counter.recount()
@@ -19,6 +19,25 @@ class HelperSerializer(serializers.ModelSerializer):
             return True
         return False
 
+    @staticmethod
+    def get_subscribed_set(goal_list, subscriber):
+        """
+        Подписки subscriber на профили страницы одним запросом (goal IN (...))
+        :return: {goal_id, ...}
+        """
+        if subscriber is None:
+            return set()
+        return set(Subscription.objects.filter(subscriber=subscriber, goal__in=[goal.pk for goal in goal_list])
+                   .values_list('goal_id', flat=True))
+
+    @staticmethod
+    def get_context(profile_list, auth):
+        """Контекст ProfileSerializer для списка профилей"""
+        return {
+            'auth': auth,
+            'subscribed': HelperSerializer.get_subscribed_set(goal_list=profile_list, subscriber=auth),
+        }
+
 
 class ProfileSerializer(serializers.ModelSerializer):
     """Profile"""
@@ -34,9 +53,12 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, profile):
         auth = self.context.get('auth')
-        if auth != profile:
-            return HelperSerializer.is_subscribed(goal=profile, subscriber=auth)
-        return None
+        if auth == profile:
+            return None
+        subscribed = self.context.get('subscribed', None)
+        if subscribed is not None:
+            return profile.pk in subscribed
+        return HelperSerializer.is_subscribed(goal=profile, subscriber=auth)
 
 
 class MiniProfileSerializer(serializers.ModelSerializer):
@@ -65,8 +87,8 @@ class HeaderProfileSerializer(serializers.ModelSerializer):
 
     def get_communications(self, profile):
         return {
-            'goal_quantity': len(Subscription.objects.filter(subscriber=profile)),
-            'subscribers_quantity': len(Subscription.objects.filter(goal=profile)),
+            'goal_quantity': profile.following_count,
+            'subscribers_quantity': profile.followers_count,
         }
 
     def get_is_subscribed(self, profile):
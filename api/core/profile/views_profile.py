@@ -1,14 +1,16 @@
+from django.db import IntegrityError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.response import Response
 
-from .models_profile import Profile, Subscription
+from .models_profile import Profile, Subscription, ProfileSubscriptions
 from .serializers_profile import ProfileSerializer, MiniProfileSerializer, HeaderProfileSerializer, \
-    ActionProfileSerializer, ActionUserSerializer, ActionUserPasswordSerializer
-from ..course.models_course import ProfileCourse, ProfileCourseStatus
+    ActionProfileSerializer, ActionUserSerializer, ActionUserPasswordSerializer, HelperSerializer
+from ..course.models_course import ProfileCourse, profile_course_status_registry
 from ..course.serializers_course import MiniCourseSerializer
+from ..search.filters_search import SearchIndexFilter
 from ..utils import Util, HelperFilter, HelperPaginatorValue, HelperPaginator
 
 
@@ -19,12 +21,13 @@ class ProfileView(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ProfileSerializer
 
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, SearchFilter, SearchIndexFilter, OrderingFilter)
     filter_fields = HelperFilter.PROFILE_FILTER_FIELDS
     search_fields = HelperFilter.PROFILE_SEARCH_FIELDS
     ordering_fields = HelperFilter.PROFILE_ORDERING_FIELDS
 
     pagination_max_page = HelperPaginatorValue.PROFILE_MAX_PAGE
+    pagination_count_strategy = HelperPaginatorValue.PROFILE_COUNT_STRATEGY
 
     def exists_path(self, path):
         return len(self.queryset.filter(path=path)) != 0
@@ -32,7 +35,8 @@ class ProfileView(viewsets.ModelViewSet):
     def get_frame_pagination(self, request, queryset, max_page=None):
         if max_page is None:
             max_page = self.pagination_max_page
-        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page)
+        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page,
+                                     count_strategy=self.pagination_count_strategy)
         return {
             "count": pagination.get_count(),
             "pages": pagination.get_num_pages(),
@@ -43,22 +47,24 @@ class ProfileView(viewsets.ModelViewSet):
 
     @action(methods=['get'], detail=False)
     def get_profile_data(self, request):
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         return Response(ProfileSerializer(auth).data, status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=False)
     def get_list_profile(self, request):
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
 
-        queryset = self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.queryset.select_related('user'))
         frame_pagination = self.get_frame_pagination(request, queryset)
-        serializer = ProfileSerializer(frame_pagination.get('results'), many=True, context={'auth': auth})
+        profile_list = list(frame_pagination.get('results'))
+        serializer = ProfileSerializer(profile_list, many=True,
+                                       context=HelperSerializer.get_context(profile_list, auth))
         frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=False)
     def get_list_mini_profile(self, request):
-        queryset = self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.queryset.select_related('user'))
         frame_pagination = self.get_frame_pagination(request, queryset,
                                                      max_page=HelperPaginatorValue.MINI_PROFILE_MAX_PAGE)
         serializer = MiniProfileSerializer(frame_pagination.get('results'), many=True)
@@ -71,7 +77,7 @@ class ProfileView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'path': "Пути к такому пользователю не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         profile = Profile.objects.get(path=path)
         return Response(HeaderProfileSerializer(profile, context={'auth': auth}).data, status=status.HTTP_200_OK)
 
@@ -97,7 +103,7 @@ class ActionProfileView(viewsets.ModelViewSet):
             return profile_dict.get('error', None)
 
         profile = profile_dict.get('profile')
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         if profile != auth:
             error_text = "У вас нет доступа для изменения данных от имени этого пользователя"
             return Response({'error': error_text}, status=status.HTTP_200_OK)
@@ -171,12 +177,13 @@ class CourseProfileView(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ProfileSerializer
 
-    filter_backends = (DjangoFilterBackend, SearchFilter, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, SearchFilter, SearchIndexFilter, OrderingFilter)
     filter_fields = HelperFilter.COURSE_FILTER_FIELDS
     search_fields = HelperFilter.COURSE_SEARCH_FIELDS
     ordering_fields = HelperFilter.COURSE_ORDERING_FIELDS
 
     pagination_max_page = HelperPaginatorValue.PROFILE_MAX_PAGE
+    pagination_count_strategy = HelperPaginatorValue.PROFILE_COURSE_COUNT_STRATEGY
 
     def exists_path(self, path):
         return len(self.queryset.filter(path=path)) != 0
@@ -188,7 +195,8 @@ class CourseProfileView(viewsets.ModelViewSet):
     def get_frame_pagination(self, request, queryset, max_page=None):
         if max_page is None:
             max_page = self.pagination_max_page
-        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page)
+        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page,
+                                     count_strategy=self.pagination_count_strategy)
         return {
             "count": pagination.get_count(),
             "pages": pagination.get_num_pages(),
@@ -203,21 +211,24 @@ class CourseProfileView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'path': "Пути к такому пользователю не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         profile = Profile.objects.get(path=path)
 
         self.swap_filters_field(HelperFilter.PROFILE_COURSE_TYPE)
-        status_studying = ProfileCourseStatus.objects.filter(name=Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
-        profile_course_list = ProfileCourse.objects.filter(profile=profile, status__in=status_studying)
+        status_studying = profile_course_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+        profile_course_list = ProfileCourse.objects.filter(profile=profile, status=status_studying) \
+            .select_related('status', 'course__profile__user')
         queryset = self.filter_queryset(profile_course_list)
         self.swap_filters_field(HelperFilter.COURSE_TYPE)
 
         frame_pagination = self.get_frame_pagination(request, queryset,
                                                      max_page=HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
+        # ProfileCourse страницы и есть состояние profile по этим курсам
+        profile_course_dict = {item.course_id: item for item in frame_pagination.get('results')}
+        context = {'profile': profile, 'auth': auth, 'profile_courses': profile_course_dict}
         serializer_list = list()
         for profile_course in frame_pagination.get('results'):
-            serializer_list.append(
-                MiniCourseSerializer(profile_course.course, context={'profile': profile, 'auth': auth}).data)
+            serializer_list.append(MiniCourseSerializer(profile_course.course, context=context).data)
         frame_pagination['results'] = serializer_list
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
@@ -227,22 +238,25 @@ class CourseProfileView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'path': "Пути к такому пользователю не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         profile = Profile.objects.get(path=path)
 
         self.swap_filters_field(HelperFilter.PROFILE_COURSE_TYPE)
-        status_studied = ProfileCourseStatus.objects.filter(name=Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
-        profile_course_list = ProfileCourse.objects.filter(profile=profile, status__in=status_studied)
+        status_studied = profile_course_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
+        profile_course_list = ProfileCourse.objects.filter(profile=profile, status=status_studied) \
+            .select_related('status', 'course__profile__user')
         queryset = self.filter_queryset(profile_course_list)
         self.swap_filters_field(HelperFilter.COURSE_TYPE)
 
         frame_pagination = self.get_frame_pagination(request, queryset,
                                                      max_page=HelperPaginatorValue.MINI_COURSE_MAX_PAGE)
 
+        # ProfileCourse страницы и есть состояние profile по этим курсам
+        profile_course_dict = {item.course_id: item for item in frame_pagination.get('results')}
+        context = {'profile': profile, 'auth': auth, 'profile_courses': profile_course_dict}
         serializer_list = list()
         for profile_course in frame_pagination.get('results'):
-            serializer_list.append(
-                MiniCourseSerializer(profile_course.course, context={'profile': profile, 'auth': auth}).data)
+            serializer_list.append(MiniCourseSerializer(profile_course.course, context=context).data)
         frame_pagination['results'] = serializer_list
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
@@ -254,15 +268,15 @@ class CourseProfileView(viewsets.ModelViewSet):
 
         profile = Profile.objects.get(path=path)
         profile_course_list = ProfileCourse.objects.filter(profile=profile)
+        status_studying = profile_course_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+        status_studied = profile_course_status_registry.get_pk(Util.PROFILE_COURSE_STATUS_STUDIED_NAME)
 
         studying_quantity = 0
         studied_quantity = 0
         for profile_course in profile_course_list:
-            if profile_course.status is None:
-                continue
-            if profile_course.status.name == Util.PROFILE_COURSE_STATUS_STUDYING_NAME:
+            if profile_course.status_id == status_studying:
                 studying_quantity += 1
-            elif profile_course.status.name == Util.PROFILE_COURSE_STATUS_STUDIED_NAME:
+            elif profile_course.status_id == status_studied:
                 studied_quantity += 1
 
         percent = 0
@@ -290,6 +304,7 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
     ordering_fields = HelperFilter.SUBSCRIBER_ORDERING_FIELDS
 
     pagination_max_page = HelperPaginatorValue.PROFILE_MAX_PAGE
+    pagination_count_strategy = HelperPaginatorValue.SUBSCRIPTION_COUNT_STRATEGY
 
     def exists_path(self, path):
         return len(self.profiles.filter(path=path)) != 0
@@ -304,7 +319,8 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
     def get_frame_pagination(self, request, queryset, max_page=None):
         if max_page is None:
             max_page = self.pagination_max_page
-        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page)
+        pagination = HelperPaginator(request=request, queryset=queryset, max_page=max_page,
+                                     count_strategy=self.pagination_count_strategy)
         return {
             "count": pagination.get_count(),
             "pages": pagination.get_num_pages(),
@@ -319,15 +335,15 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'path': "Пути к такому пользователю не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         profile = Profile.objects.get(path=path)
-        queryset = self.filter_queryset(self.queryset.filter(subscriber=profile))
+        queryset = self.filter_queryset(self.queryset.filter(subscriber=profile).select_related('goal__user'))
 
         frame_pagination = self.get_frame_pagination(request, queryset)
-        serializer_list = list()
-        for subscription in frame_pagination.get('results'):
-            serializer_list.append(ProfileSerializer(subscription.goal, context={'auth': auth}).data)
-        frame_pagination['results'] = serializer_list
+        profile_list = [subscription.goal for subscription in frame_pagination.get('results')]
+        serializer = ProfileSerializer(profile_list, many=True,
+                                       context=HelperSerializer.get_context(profile_list, auth))
+        frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
     @action(methods=['get'], detail=False)
@@ -336,17 +352,17 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
         if not self.exists_path(path):
             return Response({'path': "Пути к такому пользователю не существует"}, status=status.HTTP_404_NOT_FOUND)
 
-        auth = Profile.objects.get(user=self.request.user)
+        auth = self.request.profile
         profile = Profile.objects.get(path=path)
         self.swap_filters_field(HelperFilter.GOAL_TYPE)
-        queryset = self.filter_queryset(self.queryset.filter(goal=profile))
+        queryset = self.filter_queryset(self.queryset.filter(goal=profile).select_related('subscriber__user'))
         self.swap_filters_field(HelperFilter.SUBSCRIBER_TYPE)
 
         frame_pagination = self.get_frame_pagination(request, queryset)
-        serializer_list = list()
-        for subscriber in frame_pagination.get('results'):
-            serializer_list.append(ProfileSerializer(subscriber.subscriber, context={'auth': auth}).data)
-        frame_pagination['results'] = serializer_list
+        profile_list = [subscription.subscriber for subscription in frame_pagination.get('results')]
+        serializer = ProfileSerializer(profile_list, many=True,
+                                       context=HelperSerializer.get_context(profile_list, auth))
+        frame_pagination['results'] = serializer.data
         return Response(frame_pagination, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
@@ -363,8 +379,11 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
         if self.is_subscribe(goal=profile, subscriber=auth):
             return Response({'error': 'Вы уже подписались на этого пользователя'}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = Subscription.objects.create(goal=profile, subscriber=auth)
-        serializer.save()
+        try:
+            ProfileSubscriptions.subscribe(goal=profile, subscriber=auth)
+        except IntegrityError:
+            # параллельный запрос успел подписаться
+            return Response({'error': 'Вы уже подписались на этого пользователя'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
             'success': f'Успешно подписались на {profile.user.username}'
         }, status=status.HTTP_200_OK)
@@ -383,8 +402,7 @@ class SubscriptionProfileView(viewsets.ModelViewSet):
         if not self.is_subscribe(goal=profile, subscriber=auth):
             return Response({'error': 'Вы уже отписались на этого пользователя'}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = Subscription.objects.get(goal=profile, subscriber=auth)
-        serializer.delete()
+        ProfileSubscriptions.unsubscribe(goal=profile, subscriber=auth)
         return Response({
             'success': f'Успешно отписались от {profile.user.username}'
         }, status=status.HTTP_200_OK)
@@ -0,0 +1,12 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .models_search import SearchIndex
+
+
+class SearchIndexFilter(BaseFilterBackend):
+    """?q= - поиск по SearchIndex с сортировкой по рангу (в отличие от ?search= без LIKE '%...%' и JOIN)"""
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return SearchIndex.filter_queryset(queryset, query)
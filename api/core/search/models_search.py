@@ -0,0 +1,254 @@
+import re
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, Max, OuterRef, Q, Subquery, Sum, When
+from django.db.models.signals import post_init, post_save, post_delete
+
+from .suggest_search import suggest_index, suggest_course, suggest_collection, suggest_profile, suggest_user, \
+    remove_suggest_course, remove_suggest_collection, remove_suggest_profile, SuggestState
+from ..collection.models_collection import Collection, ProfileCollection
+from ..course.models_course import Course, CourseCatalogEntry, CourseSkill, ProfileCourse, CourseStatus
+from ..models import User
+from ..profile.models_profile import Profile
+
+# ############## SEARCH START ###############
+
+
+class SearchTerm(models.Model):
+    """Inverted index: term -> document (kind, object_id) with weight"""
+    kind = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    term = models.CharField(max_length=64)
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        unique_together = ('kind', 'object_id', 'term')
+        indexes = [
+            models.Index(fields=['kind', 'term', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.object_id}: {self.term} ({self.weight}) [Search]'
+
+
+class SearchIndex:
+    """
+    Поддержка SearchTerm и поиск по нему.
+    Документ - курс, подборка или профиль; термы - слова его полей с весом поля.
+    Поиск по префиксам слов запроса (term >= 'abc' AND term < 'abc\\uffff'), все слова должны совпасть,
+    ранг - сумма весов совпавших термов (полное совпадение слова считается дважды).
+    """
+    COURSE = 'course'
+    COLLECTION = 'collection'
+    PROFILE = 'profile'
+
+    TERM_MAX_LENGTH = 64
+    QUERY_MAX_TERMS = 8
+
+    # модель списка -> (вид документа, поле с id документа)
+    targets = dict()
+
+    @staticmethod
+    def register(model, kind, key='pk'):
+        SearchIndex.targets[model] = (kind, key)
+
+    @staticmethod
+    def tokenize(text):
+        if not text:
+            return []
+        return [token[:SearchIndex.TERM_MAX_LENGTH] for token in re.findall(r'\w+', str(text).lower())]
+
+    @staticmethod
+    def get_terms(fields):
+        """[(текст, вес)] -> {term: weight}"""
+        terms = defaultdict(int)
+        for text, weight in fields:
+            for token in SearchIndex.tokenize(text):
+                terms[token] += weight
+        return terms
+
+    # DOCUMENTS
+    @staticmethod
+    def get_course_fields(course):
+        fields = [(course.title, 3), (course.description, 1), (course.profile.user.username, 1)]
+        skill_list = CourseSkill.objects.filter(course_info__course=course).values_list('name', flat=True)
+        fields.extend((name, 2) for name in skill_list)
+        return fields
+
+    @staticmethod
+    def get_collection_fields(collection):
+        return [(collection.title, 3), (collection.profile.user.username, 1)]
+
+    @staticmethod
+    def get_profile_fields(profile):
+        return [(profile.user.username, 3), (profile.path, 1)]
+
+    @staticmethod
+    def index_document(kind, object_id, fields):
+        """Записывает только разницу с уже проиндексированными термами; вернет True, если что-то изменилось"""
+        terms = SearchIndex.get_terms(fields)
+        current = dict(SearchTerm.objects.filter(kind=kind, object_id=object_id).values_list('term', 'weight'))
+        if current == terms:
+            return False
+
+        with transaction.atomic():
+            removed = [term for term in current if term not in terms]
+            if len(removed) != 0:
+                SearchTerm.objects.filter(kind=kind, object_id=object_id, term__in=removed).delete()
+            for term, weight in terms.items():
+                if (term in current) and (current[term] != weight):
+                    SearchTerm.objects.filter(kind=kind, object_id=object_id, term=term).update(weight=weight)
+            SearchTerm.objects.bulk_create([
+                SearchTerm(kind=kind, object_id=object_id, term=term, weight=weight)
+                for term, weight in terms.items() if term not in current
+            ])
+        return True
+
+    @staticmethod
+    def remove_document(kind, object_id):
+        SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+    @staticmethod
+    def index_course(course):
+        return SearchIndex.index_document(SearchIndex.COURSE, course.pk, SearchIndex.get_course_fields(course))
+
+    @staticmethod
+    def index_collection(collection):
+        return SearchIndex.index_document(SearchIndex.COLLECTION, collection.pk,
+                                          SearchIndex.get_collection_fields(collection))
+
+    @staticmethod
+    def index_profile(profile):
+        """Имя пользователя есть и в его курсах и подборках - при изменении переиндексируются и они"""
+        if not SearchIndex.index_document(SearchIndex.PROFILE, profile.pk, SearchIndex.get_profile_fields(profile)):
+            return False
+        for course in Course.objects.filter(profile=profile).select_related('profile__user'):
+            SearchIndex.index_course(course)
+        for collection in Collection.objects.filter(profile=profile).select_related('profile__user'):
+            SearchIndex.index_collection(collection)
+        return True
+
+    @staticmethod
+    def rebuild():
+        """Полная пересборка индекса"""
+        SearchTerm.objects.all().delete()
+        for profile in Profile.objects.select_related('user'):
+            SearchIndex.index_document(SearchIndex.PROFILE, profile.pk, SearchIndex.get_profile_fields(profile))
+        for course in Course.objects.select_related('profile__user'):
+            SearchIndex.index_course(course)
+        for collection in Collection.objects.select_related('profile__user'):
+            SearchIndex.index_collection(collection)
+
+    # SEARCH
+    @staticmethod
+    def get_prefix_filter(token):
+        return Q(term__gte=token, term__lt=f"{token}\uffff")
+
+    @staticmethod
+    def get_ranked(kind, query):
+        """Документы, в которых есть все слова query: values (object_id, search_rank); None - пустой запрос"""
+        tokens = list(dict.fromkeys(SearchIndex.tokenize(query)))[:SearchIndex.QUERY_MAX_TERMS]
+        if len(tokens) == 0:
+            return None
+
+        any_token = Q()
+        matched = dict()
+        for i, token in enumerate(tokens):
+            any_token |= SearchIndex.get_prefix_filter(token)
+            matched[f'matched_{i}'] = Max(Case(When(SearchIndex.get_prefix_filter(token), then=1), default=0))
+        rank = Sum(Case(When(term__in=tokens, then=F('weight') * 2), default=F('weight')))
+        return SearchTerm.objects.filter(kind=kind).filter(any_token).values('object_id') \
+            .annotate(search_rank=rank, **matched).filter(**{name: 1 for name in matched}) \
+            .order_by()
+
+    @staticmethod
+    def filter_queryset(queryset, query):
+        """queryset зарегистрированной модели, отфильтрованный по query и отсортированный по рангу"""
+        target = SearchIndex.targets.get(queryset.model, None)
+        if target is None:
+            return queryset
+        kind, key = target
+        ranked = SearchIndex.get_ranked(kind, query)
+        if ranked is None:
+            return queryset
+        search_rank = Subquery(ranked.filter(object_id=OuterRef(key)).values('search_rank')[:1])
+        return queryset.filter(**{f'{key}__in': ranked.values('object_id')}) \
+            .annotate(search_rank=search_rank).order_by('-search_rank', 'pk')
+
+
+SearchIndex.register(Course, SearchIndex.COURSE)
+SearchIndex.register(CourseCatalogEntry, SearchIndex.COURSE, key='course_id')
+SearchIndex.register(ProfileCourse, SearchIndex.COURSE, key='course_id')
+SearchIndex.register(Collection, SearchIndex.COLLECTION)
+SearchIndex.register(ProfileCollection, SearchIndex.COLLECTION, key='collection_id')
+SearchIndex.register(Profile, SearchIndex.PROFILE)
+
+
+def index_course(sender, **kwargs):
+    """When a course is saved, update its search terms"""
+    SearchIndex.index_course(kwargs['instance'])
+
+
+def index_course_skill(sender, **kwargs):
+    """When a skill is changed, update the search terms of its course"""
+    course = Course.objects.select_related('profile__user') \
+        .filter(courseinfo=kwargs['instance'].course_info_id).first()
+    if course is not None:
+        SearchIndex.index_course(course)
+
+
+def index_collection(sender, **kwargs):
+    """When a collection is saved, update its search terms"""
+    SearchIndex.index_collection(kwargs['instance'])
+
+
+def index_profile(sender, **kwargs):
+    """When a profile is saved, update its search terms"""
+    SearchIndex.index_profile(kwargs['instance'])
+
+
+def index_user(sender, **kwargs):
+    """When a user is saved (username), update the search terms of his profile"""
+    profile = Profile.objects.select_related('user').filter(user=kwargs['instance']).first()
+    if profile is not None:
+        SearchIndex.index_profile(profile)
+
+
+def remove_course(sender, **kwargs):
+    SearchIndex.remove_document(SearchIndex.COURSE, kwargs['instance'].pk)
+
+
+def remove_collection(sender, **kwargs):
+    SearchIndex.remove_document(SearchIndex.COLLECTION, kwargs['instance'].pk)
+
+
+def remove_profile(sender, **kwargs):
+    SearchIndex.remove_document(SearchIndex.PROFILE, kwargs['instance'].pk)
+
+
+post_save.connect(index_course, sender=Course)
+post_save.connect(index_course_skill, sender=CourseSkill)
+post_delete.connect(index_course_skill, sender=CourseSkill)
+post_save.connect(index_collection, sender=Collection)
+post_save.connect(index_profile, sender=Profile)
+post_save.connect(index_user, sender=User)
+post_delete.connect(remove_course, sender=Course)
+post_delete.connect(remove_collection, sender=Collection)
+post_delete.connect(remove_profile, sender=Profile)
+
+post_init.connect(SuggestState.remember, sender=Course)
+post_init.connect(SuggestState.remember, sender=Collection)
+post_init.connect(SuggestState.remember, sender=Profile)
+post_init.connect(SuggestState.remember, sender=User)
+post_save.connect(suggest_course, sender=Course)
+post_save.connect(suggest_collection, sender=Collection)
+post_save.connect(suggest_profile, sender=Profile)
+post_save.connect(suggest_user, sender=User)
+post_delete.connect(remove_suggest_course, sender=Course)
+post_delete.connect(remove_suggest_collection, sender=Collection)
+post_delete.connect(remove_suggest_profile, sender=Profile)
+post_save.connect(suggest_index.invalidate, sender=CourseStatus)
+post_delete.connect(suggest_index.invalidate, sender=CourseStatus)
+
+# ############### SEARCH END ################
@@ -0,0 +1,257 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from ..collection.models_collection import Collection
+from ..course.models_course import Course, CourseCatalog, CourseCatalogEntry
+from ..models import User
+from ..profile.models_profile import Profile
+
+
+class SuggestIndex:
+    """
+    Подсказки при вводе (typeahead) из памяти процесса: отсортированный массив ключей и bisect.
+    Ключи документа - его подпись, начиная с каждого слова ("advanced python", "python"),
+    поэтому префикс запроса находится двоичным поиском, без запросов к базе.
+    Изменения применяются сигналами после commit; другие процессы узнают о них по поколению в кеше
+    (не чаще REFRESH_INTERVAL) и перезагружают индекс.
+    """
+    COURSE = 'course'
+    COLLECTION = 'collection'
+    PROFILE = 'profile'
+
+    MAX_KEYS = 200000
+    KEY_MAX_LENGTH = 64
+    LABEL_MAX_LENGTH = 64
+    LIMIT = 10
+    MAX_LIMIT = 20
+    SCAN_FACTOR = 8
+    REFRESH_INTERVAL = 30
+    GENERATION_KEY = 'suggest-generation'
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.keys = list()
+        self.refs = list()
+        self.documents = dict()
+        self.loaded = False
+        self.generation = None
+        self.checked_at = 0
+
+    @staticmethod
+    def get_keys(label):
+        label = label.lower()
+        return sorted({label[match.start():][:SuggestIndex.KEY_MAX_LENGTH] for match in re.finditer(r'\w+', label)})
+
+    # LOAD
+    @staticmethod
+    def get_documents():
+        """[(kind, object_id, подпись, path)] всех документов"""
+        documents = list()
+        for course_id, title, path in CourseCatalogEntry.objects.values_list('course_id', 'title', 'path'):
+            documents.append((SuggestIndex.COURSE, course_id, title, path))
+        for pk, title, path in Collection.objects.values_list('pk', 'title', 'path'):
+            documents.append((SuggestIndex.COLLECTION, pk, title, path))
+        for pk, username, path in Profile.objects.values_list('pk', 'user__username', 'path'):
+            documents.append((SuggestIndex.PROFILE, pk, username, path))
+        return documents
+
+    def load(self):
+        generation = cache.get(SuggestIndex.GENERATION_KEY, 0)
+        entries = list()
+        documents = dict()
+        for kind, object_id, label, path in self.get_documents():
+            label = label or ''
+            keys = self.get_keys(label)
+            if len(entries) + len(keys) > SuggestIndex.MAX_KEYS:
+                break
+            entries.extend((key, (kind, object_id)) for key in keys)
+            documents[(kind, object_id)] = (label[:SuggestIndex.LABEL_MAX_LENGTH], path, keys)
+        entries.sort()
+
+        with self.lock:
+            self.keys = [key for key, ref in entries]
+            self.refs = [ref for key, ref in entries]
+            self.documents = documents
+            self.loaded = True
+            self.generation = generation
+            self.checked_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if not self.loaded:
+            self.load()
+        elif time.monotonic() - self.checked_at > SuggestIndex.REFRESH_INTERVAL:
+            self.checked_at = time.monotonic()
+            if cache.get(SuggestIndex.GENERATION_KEY, 0) != self.generation:
+                self.load()
+
+    # CHANGES
+    def touch(self):
+        """Новое поколение для других процессов; свое остается актуальным, если не пропустили чужих изменений"""
+        cache.add(SuggestIndex.GENERATION_KEY, 0, None)
+        try:
+            generation = cache.incr(SuggestIndex.GENERATION_KEY)
+        except ValueError:
+            return None
+        with self.lock:
+            if self.generation == generation - 1:
+                self.generation = generation
+
+    def remove_local(self, kind, object_id):
+        with self.lock:
+            document = self.documents.pop((kind, object_id), None)
+            if document is None:
+                return None
+            for key in document[2]:
+                i = bisect_left(self.keys, key)
+                while (i < len(self.keys)) and (self.keys[i] == key):
+                    if self.refs[i] == (kind, object_id):
+                        del self.keys[i]
+                        del self.refs[i]
+                        break
+                    i += 1
+
+    def put_local(self, kind, object_id, label, path):
+        with self.lock:
+            self.remove_local(kind, object_id)
+            label = label or ''
+            keys = self.get_keys(label)
+            if len(self.keys) + len(keys) > SuggestIndex.MAX_KEYS:
+                return None
+            for key in keys:
+                i = bisect_left(self.keys, key)
+                while (i < len(self.keys)) and (self.keys[i] == key) and (self.refs[i] < (kind, object_id)):
+                    i += 1
+                self.keys.insert(i, key)
+                self.refs.insert(i, (kind, object_id))
+            self.documents[(kind, object_id)] = (label[:SuggestIndex.LABEL_MAX_LENGTH], path, keys)
+
+    def put(self, kind, object_id, label, path):
+        def apply():
+            if self.loaded:
+                self.put_local(kind, object_id, label, path)
+            self.touch()
+        transaction.on_commit(apply)
+
+    def remove(self, kind, object_id):
+        def apply():
+            if self.loaded:
+                self.remove_local(kind, object_id)
+            self.touch()
+        transaction.on_commit(apply)
+
+    def invalidate(self, sender=None, **kwargs):
+        def apply():
+            self.loaded = False
+            self.touch()
+        transaction.on_commit(apply)
+
+    # SUGGEST
+    def suggest(self, query, limit=LIMIT):
+        query = query.strip().lower()[:SuggestIndex.KEY_MAX_LENGTH]
+        if len(query) == 0:
+            return []
+        self.ensure_fresh()
+        limit = min(max(int(limit), 1), SuggestIndex.MAX_LIMIT)
+
+        results = list()
+        seen = set()
+        with self.lock:
+            start = bisect_left(self.keys, query)
+            end = min(start + limit * SuggestIndex.SCAN_FACTOR, len(self.keys))
+            for i in range(start, end):
+                if not self.keys[i].startswith(query):
+                    break
+                ref = self.refs[i]
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                label, path, keys = self.documents[ref]
+                results.append({'type': ref[0], 'title': label, 'path': path})
+                if len(results) == limit:
+                    break
+        return results
+
+
+suggest_index = SuggestIndex()
+
+
+class SuggestState:
+    """
+    Поля подсказки экземпляра на момент загрузки (post_init). Сохранение, которое не меняет подпись, path
+    или публикацию, не трогает индекс и поколение: иначе каждый save заставлял бы остальные процессы
+    перечитывать весь индекс
+    """
+    FIELDS = {
+        Course: ('title', 'path', 'status_id'),
+        Collection: ('title', 'path'),
+        Profile: ('path',),
+        User: ('username',),
+    }
+
+    @staticmethod
+    def get(sender, instance):
+        # только загруженные значения: отложенное (defer/only) поле не должно вызывать запрос
+        return tuple(instance.__dict__.get(name, None) for name in SuggestState.FIELDS[sender])
+
+    @staticmethod
+    def remember(sender, instance, **kwargs):
+        instance._suggest_state = SuggestState.get(sender, instance)
+
+    @staticmethod
+    def pop_changes(sender, instance, created):
+        """(изменились ли поля подсказки, их прежние значения), запоминает текущие для следующего save"""
+        old = getattr(instance, '_suggest_state', None)
+        instance._suggest_state = SuggestState.get(sender, instance)
+        return created or (old != instance._suggest_state), old
+
+
+def suggest_course(sender, **kwargs):
+    """When a course is saved, suggest it only while it is released"""
+    course = kwargs['instance']
+    changed, old = SuggestState.pop_changes(sender, course, kwargs.get('created', False))
+    if not changed:
+        return None
+    if CourseCatalog.is_released(course):
+        suggest_index.put(SuggestIndex.COURSE, course.pk, course.title, course.path)
+    elif (old is not None) and (old[2] is not None) and (old[2] == CourseCatalog.get_status_release_pk()):
+        # снят с публикации; неопубликованных курсов в индексе нет
+        suggest_index.remove(SuggestIndex.COURSE, course.pk)
+
+
+def suggest_collection(sender, **kwargs):
+    collection = kwargs['instance']
+    if SuggestState.pop_changes(sender, collection, kwargs.get('created', False))[0]:
+        suggest_index.put(SuggestIndex.COLLECTION, collection.pk, collection.title, collection.path)
+
+
+def suggest_profile(sender, **kwargs):
+    profile = kwargs['instance']
+    if SuggestState.pop_changes(sender, profile, kwargs.get('created', False))[0]:
+        suggest_index.put(SuggestIndex.PROFILE, profile.pk, profile.user.username, profile.path)
+
+
+def suggest_user(sender, **kwargs):
+    """When a username is changed, update the label of his profile"""
+    if not SuggestState.pop_changes(sender, kwargs['instance'], kwargs.get('created', False))[0]:
+        return None
+    profile = Profile.objects.select_related('user').filter(user=kwargs['instance']).first()
+    if profile is not None:
+        suggest_index.put(SuggestIndex.PROFILE, profile.pk, profile.user.username, profile.path)
+
+
+def remove_suggest_course(sender, **kwargs):
+    if CourseCatalog.is_released(kwargs['instance']):
+        suggest_index.remove(SuggestIndex.COURSE, kwargs['instance'].pk)
+
+
+def remove_suggest_collection(sender, **kwargs):
+    suggest_index.remove(SuggestIndex.COLLECTION, kwargs['instance'].pk)
+
+
+def remove_suggest_profile(sender, **kwargs):
+    suggest_index.remove(SuggestIndex.PROFILE, kwargs['instance'].pk)
@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from .views_search import SearchView
+
+router = DefaultRouter()
+
+urlpatterns = [
+    path('', include(router.urls)),
+
+    path('suggest/', SearchView.as_view({'get': 'get_suggest'})),
+]
@@ -0,0 +1,20 @@
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .suggest_search import suggest_index, SuggestIndex
+
+
+class SearchView(viewsets.ViewSet):
+    """Поиск"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(methods=['get'], detail=False)
+    def get_suggest(self, request):
+        """Подсказки при вводе: курсы, подборки и пользователи, чьи названия начинаются с ?q="""
+        try:
+            limit = int(request.query_params.get('limit', SuggestIndex.LIMIT))
+        except ValueError:
+            limit = SuggestIndex.LIMIT
+        results = suggest_index.suggest(request.query_params.get('q', ''), limit)
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -1,3 +1,207 @@
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .course.models_course import Course, CourseCatalogEntry, CourseStatus, Theme, Lesson, Step, ProfileCourse, \
+    ProfileCourseStatus, ProfileStepStatus, ProfileStep, ProfileTheme, ProfileLesson
+from .course.loaders_course import CourseTreeLoader
+from .course.serializers_course import ProgressUpdater, CompleteStepBatchSerializer
+from .models import User
+from .profile.models_profile import Profile
+from .search.suggest_search import SuggestIndex
+from .utils import Util
+
+
+class ProgressUpdaterTest(TestCase):
+    def setUp(self):
+        for name in (Util.COURSE_STATUS_DEV_NAME, Util.COURSE_STATUS_RELEASE_NAME):
+            CourseStatus.objects.create(name=name)
+        for name in (Util.PROFILE_COURSE_STATUS_SEE_NAME, Util.PROFILE_COURSE_STATUS_STUDYING_NAME,
+                     Util.PROFILE_COURSE_STATUS_STUDIED_NAME):
+            ProfileCourseStatus.objects.create(name=name)
+            ProfileStepStatus.objects.create(name=name)
+
+        author = User.objects.create_user(username='author', email='author@test.local', password='Pass!word1')
+        learner = User.objects.create_user(username='learner', email='learner@test.local', password='Pass!word1')
+        self.profile = Profile.objects.get(user=learner)
+        self.course = Course.objects.create(title='Course', profile=Profile.objects.get(user=author))
+        theme = Theme.objects.create(course=self.course, title='Theme')
+        self.lesson = Lesson.objects.create(theme=theme, title='Lesson')
+        self.profile_steps = [
+            ProfileStep.objects.create(profile=self.profile, step=Step.objects.create(lesson=self.lesson, title=title))
+            for title in ('first', 'second')
+        ]
+
+    def complete_overlapping(self, manager, method):
+        """
+        Два первых прохождения шагов урока: второе целиком выполняется внутри первого,
+        перед вызовом manager.method (между проверкой строк уровня и их вставкой)
+        """
+        first, second = self.profile_steps
+        original = getattr(manager, method)
+
+        def overlapping(*args, **kwargs):
+            with mock.patch.object(manager, method, original):
+                ProgressUpdater.update_progress(old=0, new=7, profile_step=second)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(manager, method, overlapping):
+            ProgressUpdater.update_progress(old=0, new=5, profile_step=first)
+
+    def assert_progress(self):
+        self.assertEqual(ProfileLesson.objects.get(profile=self.profile, lesson=self.lesson).progress, 12)
+        self.assertEqual(ProfileTheme.objects.get(profile=self.profile).progress, 12)
+        profile_course = ProfileCourse.objects.get(profile=self.profile, course=self.course)
+        self.assertEqual(profile_course.progress, 12)
+        self.assertEqual(profile_course.status.name, Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual(course.members_amount, 1)
+        self.assertEqual(course.studying_amount, 1)
+        self.assertEqual(course.completed_amount, 0)
+
+    def test_overlapping_lesson_insert(self):
+        self.complete_overlapping(ProfileLesson.objects, 'bulk_create')
+        self.assert_progress()
+
+    def test_overlapping_course_insert(self):
+        self.complete_overlapping(ProfileCourse.objects, 'get_or_create')
+        self.assert_progress()
+
+    def test_overlapping_current_step(self):
+        """Параллельный запрос создал ProfileLesson между UPDATE и get_or_create: указатель все равно переносится"""
+        first, second = [profile_step.step for profile_step in self.profile_steps]
+        original = ProfileLesson.objects.get_or_create
+
+        def overlapping(*args, **kwargs):
+            ProfileLesson.objects.create(profile=self.profile, lesson=self.lesson, current_step=first)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(ProfileLesson.objects, 'get_or_create', overlapping):
+            ProgressUpdater.set_current_step(profile=self.profile, step=second)
+        self.assertEqual(ProfileLesson.objects.get(profile=self.profile, lesson=self.lesson).current_step_id, second.pk)
+
+    def test_batch_moves_current_step(self):
+        """Пакет офлайн-клиента переносит "продолжить" на последний по времени шаг урока"""
+        first, second = [profile_step.step for profile_step in self.profile_steps]
+        ProgressUpdater.set_current_step(profile=self.profile, step=first)
+        ProfileCourse.objects.create(profile=self.profile, course=self.course)
+
+        item = {'theme': first.lesson.theme.path, 'lesson': first.lesson.path}
+        serializer = CompleteStepBatchSerializer(data={'steps': [
+            dict(item, step=second.path, date_action='2026-01-02T10:00:00Z'),
+            dict(item, step=first.path, date_action='2026-01-01T10:00:00Z'),
+        ]}, context={'profile': self.profile, 'tree': CourseTreeLoader(course=self.course, profile=self.profile)})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(ProfileLesson.objects.get(profile=self.profile, lesson=self.lesson).current_step_id, second.pk)
+
+    def test_overlapping_start_learn(self):
+        """Второй запрос "начать изучение" проиграл гонку за вставку ProfileCourse: 400, а не 500"""
+        self.course.path = 'course'
+        self.course.save()
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+        original = ProfileCourse.objects.create
+
+        def overlapping(*args, **kwargs):
+            original(*args, **kwargs)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(ProfileCourse.objects, 'create', overlapping):
+            response = client.post('/api/courses/start-learn/course/')
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseCatalogTest(TestCase):
+    def setUp(self):
+        for name in (Util.COURSE_STATUS_DEV_NAME, Util.COURSE_STATUS_RELEASE_NAME):
+            CourseStatus.objects.create(name=name)
+        for name in (Util.PROFILE_COURSE_STATUS_SEE_NAME, Util.PROFILE_COURSE_STATUS_STUDYING_NAME,
+                     Util.PROFILE_COURSE_STATUS_STUDIED_NAME):
+            ProfileCourseStatus.objects.create(name=name)
+            ProfileStepStatus.objects.create(name=name)
+
+        self.author = User.objects.create_user(username='author', email='author@test.local', password='Pass!word1')
+        self.course = Course.objects.create(title='Course', profile=Profile.objects.get(user=self.author))
+        self.course.status = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
+        self.course.save()
+
+        self.learner = User.objects.create_user(username='learner', email='learner@test.local', password='Pass!word1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+
+    def get_titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.json()['results']]
+
+    def test_filter_by_author_username(self):
+        self.assertEqual(self.get_titles('/api/courses/?profile__user__username=author'), ['Course'])
+        self.assertEqual(self.get_titles('/api/courses/?profile__user__username=learner'), [])
+        self.assertEqual(self.get_titles('/api/mini-courses/?profile__user__username=learner'), [])
+
+    def test_author_rename(self):
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(CourseCatalogEntry.objects.get(course=self.course).author, 'renamed')
+        self.assertEqual(self.get_titles('/api/courses/?profile__user__username=renamed'), ['Course'])
+
+    def test_enrolled_viewer_state(self):
+        """Каталог по JWT (profile_id из токена) показывает статус и прогресс записавшегося пользователя"""
+        ProfileCourse.objects.create(profile=Profile.objects.get(user=self.learner), course=self.course)
+        access = self.client.post('/api/login/', {'email': 'learner@test.local', 'password': 'Pass!word1'},
+                                  format='json').json()['access']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        for url in ('/api/courses/', '/api/mini-courses/'):
+            item = client.get(url).json()['results'][0]
+            self.assertEqual(item['status_progress'], Util.PROFILE_COURSE_STATUS_STUDYING_NAME)
+            self.assertEqual(item['progress'], {'progress': 0, 'max_progress': 0})
+        self.assertEqual(client.get('/api/courses/').json()['results'][0]['quantity_in_collection'], 1)
+
+
+class LoginViewTest(TestCase):
+    def test_response_keeps_legacy_token(self):
+        """Прежние поля ответа (в том числе token) остаются, access/refresh - пара simplejwt с profile_id"""
+        user = User.objects.create_user(username='learner', email='learner@test.local', password='Pass!word1')
+        response = APIClient().post('/api/login/', {'email': 'learner@test.local', 'password': 'Pass!word1'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        payload = jwt.decode(data['token'], settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertEqual((payload['username'], payload['email']), (user.username, user.email))
+        self.assertEqual(AccessToken(data['access'])['profile_id'], Profile.objects.get(user=user).pk)
+        self.assertIn('refresh', data)
+
+
+class SuggestIndexTest(TestCase):
+    def setUp(self):
+        for name in (Util.COURSE_STATUS_DEV_NAME, Util.COURSE_STATUS_RELEASE_NAME):
+            CourseStatus.objects.create(name=name)
+        user = User.objects.create_user(username='author', email='author@test.local', password='Pass!word1')
+        self.course = Course.objects.create(title='Course', profile=Profile.objects.get(user=user))
+        cache.delete(SuggestIndex.GENERATION_KEY)
+
+    def count_generations(self, change):
+        """Сколько раз change сменил поколение индекса подсказок"""
+        with self.captureOnCommitCallbacks(execute=True):
+            change(Course.objects.get(pk=self.course.pk))
+        return cache.get(SuggestIndex.GENERATION_KEY, 0)
+
+    def test_draft_save_keeps_generation(self):
+        self.assertEqual(self.count_generations(lambda course: course.save()), 0)
+
+    def test_unchanged_label_keeps_generation(self):
+        def release(course):
+            course.status = CourseStatus.objects.get(name=Util.COURSE_STATUS_RELEASE_NAME)
+            course.save()
+            course.rating = 5
+            course.save()
 
-# Create your tests here.
+        self.assertEqual(self.count_generations(release), 1)
@@ -11,4 +11,5 @@ urlpatterns = [
     path('', include('core.course.urls_course')),
     path('', include('core.collection.urls_collection')),
     path('', include('core.profile.urls_profile')),
+    path('', include('core.search.urls_search')),
 ]
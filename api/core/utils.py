@@ -1,3 +1,7 @@
+import base64
+import binascii
+import json
+import math
 import os
 
 from django.contrib.sites.shortcuts import get_current_site
@@ -5,10 +9,14 @@ from django.core.files.images import ImageFile
 # from django.core.mail import send_mail
 from django.core.mail import EmailMessage
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.db.models import Q, Exists, OuterRef, Subquery
 from django.urls import reverse
+from django.utils.functional import cached_property
 from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .helpers.counter import TableCounter
+
 
 class Util:
     PROFILE_COURSE_STATUS_SEE_NAME = 'Наблюдающий'
@@ -89,25 +97,17 @@ class Util:
         return "-".join(new_path.split())
 
     @staticmethod
-    def get_new_path(new_path, old_path, model):
+    def get_new_path(new_path, old_path, model, scope=None):
+        """scope - фильтр родителя, в пределах которого path уникален, например {'course': course}"""
         if new_path is not None:
             if len(new_path) == 0:
                 raise ValueError("path не может быть пустым")
-            all_path = model.objects.filter(path=new_path)
-            if (len(all_path) == 0) or (len(all_path) == 1 and new_path == old_path):
+            if (new_path == old_path) or (not model.objects.filter(path=new_path, **(scope or dict())).exists()):
                 return new_path
             else:
                 raise ValueError("Такой path уже существует")
         return old_path
 
-    @staticmethod
-    def get_max_path(queryset):
-        max_path = 0
-        for item in queryset:
-            if (type(item.path) == int) and (item.path > max_path):
-                max_path = item.path
-        return max_path
-
 
 class HelperFilter:
     # COLLECTION
@@ -129,6 +129,11 @@ class HelperFilter:
     COURSE_SEARCH_FIELDS = ('title', 'profile__user__username')
     COURSE_ORDERING_FIELDS = ('rating', 'title')
 
+    CATALOG_COURSE_TYPE = 8
+    CATALOG_COURSE_FILTER_FIELDS = ('title', 'author')
+    CATALOG_COURSE_SEARCH_FIELDS = ('title', 'author')
+    CATALOG_COURSE_ORDERING_FIELDS = ('rating', 'title')
+
     PROFILE_COURSE_TYPE = 4
     PROFILE_COURSE_FILTER_FIELDS = ('course__title', 'course__profile__user__username')
     PROFILE_COURSE_SEARCH_FIELDS = ('course__title', 'course__profile__user__username')
@@ -155,6 +160,30 @@ class HelperFilter:
     SUBSCRIBER_SEARCH_FIELDS = ('subscriber__path', 'subscriber__user__username')
     SUBSCRIBER_ORDERING_FIELDS = ('subscriber__path', 'subscriber__user__username')
 
+    @staticmethod
+    def get_related_queryset(queryset, related_queryset, related_name):
+        """
+        Объекты queryset, на которые ссылается related_queryset (уже прошедший filter_queryset), в его порядке:
+        related_name__field сортирует по field, остальные поля (pk, search_rank) переносятся через Subquery.
+        По умолчанию и при равенстве - порядок добавления (pk строки связи)
+        """
+        prefix = f"{related_name}__"
+        related = related_queryset.filter(**{related_name: OuterRef('pk')}).order_by()
+        queryset = queryset.filter(Exists(related))
+
+        ordering = [field for field in related_queryset.query.order_by if field.lstrip('-') != 'pk'] + ['pk']
+        related_ordering = list()
+        for field in ordering:
+            name = field.lstrip('-')
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+            else:
+                alias = f"related_{name}"
+                queryset = queryset.annotate(**{alias: Subquery(related.values(name)[:1])})
+                name = alias
+            related_ordering.append(f"-{name}" if field.startswith('-') else name)
+        return queryset.order_by(*related_ordering)
+
     @staticmethod
     def get_filters_collection_field(type_filter):
         if type_filter == HelperFilter.COLLECTION_TYPE:
@@ -180,6 +209,11 @@ class HelperFilter:
             search_fields = HelperFilter.PROFILE_COURSE_SEARCH_FIELDS
             ordering_fields = HelperFilter.PROFILE_COURSE_ORDERING_FIELDS
             return filter_fields, search_fields, ordering_fields
+        elif type_filter == HelperFilter.CATALOG_COURSE_TYPE:
+            filter_fields = HelperFilter.CATALOG_COURSE_FILTER_FIELDS
+            search_fields = HelperFilter.CATALOG_COURSE_SEARCH_FIELDS
+            ordering_fields = HelperFilter.CATALOG_COURSE_ORDERING_FIELDS
+            return filter_fields, search_fields, ordering_fields
 
     @staticmethod
     def get_filters_profile_field(type_filter):
@@ -214,20 +248,210 @@ class HelperPaginatorValue:
     MINI_PROFILE_MAX_PAGE = 40
 
     PAGE_QUERY_PARAM = 'page'
+    CURSOR_QUERY_PARAM = 'cursor'
+    COUNT_QUERY_PARAM = 'count'
+
+    # Стратегии подсчета count/pages:
+    # exact - COUNT(*) на каждый запрос (небольшие таблицы);
+    # cached - без фильтров количество строк таблицы из кеша (TableCounter), с фильтрами/поиском как capped;
+    # capped - считается не дальше COUNT_CAPPED_LIMIT строк (и запрошенной страницы), больше - "1000+"
+    COUNT_EXACT = 'exact'
+    COUNT_CACHED = 'cached'
+    COUNT_CAPPED = 'capped'
+    COUNT_CAPPED_LIMIT = 1000
+
+    COLLECTION_COUNT_STRATEGY = COUNT_CACHED
+    COURSE_COUNT_STRATEGY = COUNT_CACHED
+    PROFILE_COUNT_STRATEGY = COUNT_CACHED
+    PROFILE_COURSE_COUNT_STRATEGY = COUNT_EXACT
+    SUBSCRIPTION_COUNT_STRATEGY = COUNT_CAPPED
+
+
+class HelperPaginatorCount:
+    """Количество записей queryset по стратегии HelperPaginatorValue.COUNT_*"""
+
+    def __init__(self, queryset, strategy, limit=HelperPaginatorValue.COUNT_CAPPED_LIMIT):
+        self.queryset = queryset
+        self.strategy = strategy
+        self.limit = max(int(limit), HelperPaginatorValue.COUNT_CAPPED_LIMIT)
+        self.value, self.exact = self.get_value()
+
+    @staticmethod
+    def is_unfiltered(queryset):
+        return (not queryset.query.where) and (not queryset.query.distinct) and (not queryset.query.is_sliced)
+
+    def get_value(self):
+        """(количество, точное ли оно); неточное значение - limit + 1"""
+        if self.strategy == HelperPaginatorValue.COUNT_EXACT:
+            return self.queryset.count(), True
+        if self.strategy == HelperPaginatorValue.COUNT_CACHED:
+            counter = TableCounter.get_counter(self.queryset.model)
+            if (counter is not None) and self.is_unfiltered(self.queryset):
+                return counter.get(), True
+        count = self.queryset.order_by()[:self.limit + 1].count()
+        return count, count <= self.limit
+
+    def get_display(self, value):
+        return value if self.exact else f"{value}+"
+
+    def get_known_count(self):
+        return self.value if self.exact else self.limit
+
+    def get_count(self):
+        return self.get_display(self.get_known_count())
+
+    def get_num_pages(self, per_page):
+        hits = max(1, self.get_known_count())
+        return self.get_display(math.ceil(hits / per_page))
+
+
+class HelperCountPaginator(Paginator):
+    """Paginator, которому количество записей передается готовым (HelperPaginatorCount)"""
+
+    def __init__(self, object_list, per_page, counter):
+        super().__init__(object_list, per_page)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        return self.counter.value
+
+
+class HelperKeysetPaginator:
+    """
+    Keyset (seek) пагинация: WHERE (поля сортировки) > (значения последней строки) LIMIT n, без OFFSET и COUNT.
+    Курсор - значения полей сортировки крайней строки страницы и направление.
+    Поля сортировки должны быть NOT NULL, в конец всегда добавляется pk.
+    """
+
+    def __init__(self, queryset, max_page, ordering, cursor):
+        self.queryset = queryset
+        self.max_page = int(max_page)
+        self.ordering = ordering
+        self.values, self.reverse = self.decode_cursor(cursor)
+        self.results, self.has_next, self.has_previous = self.get_results()
+
+    @staticmethod
+    def get_ordering(queryset):
+        """Сортировка queryset для курсора, None - если по ней нельзя построить курсор"""
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        for field in ordering:
+            if (not isinstance(field, str)) or (field == '?'):
+                return None
+        names = [field.lstrip('-') for field in ordering]
+        if ('pk' not in names) and (queryset.model._meta.pk.name not in names):
+            ordering.append('pk')
+        return ordering
+
+    @staticmethod
+    def encode_cursor(values, reverse=False):
+        data = json.dumps({'v': values, 'r': reverse}, default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Пустой или испорченный курсор - первая страница"""
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = data['v'], bool(data.get('r', False))
+        except (ValueError, TypeError, KeyError, binascii.Error):
+            return None, False
+        if (not isinstance(values, list)) or (len(values) != len(self.ordering)) or (None in values):
+            return None, False
+        return values, reverse
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f"-{field}"
+
+    def get_seek_filter(self):
+        """(a, b, pk) > (x, y, z) как a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)"""
+        seek_filter = Q()
+        equal = dict()
+        for field, value in zip(self.ordering, self.values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != self.reverse
+            seek_filter |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value})
+            equal[name] = value
+        return seek_filter
+
+    def get_results(self):
+        ordering = [self.invert(field) for field in self.ordering] if self.reverse else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if self.values is not None:
+            queryset = queryset.filter(self.get_seek_filter())
+
+        results = list(queryset[:self.max_page + 1])
+        has_more = len(results) > self.max_page
+        results = results[:self.max_page]
+        if self.reverse:
+            results.reverse()
+            return results, self.values is not None, has_more
+        return results, has_more, self.values is not None
+
+    def get_values(self, item):
+        values = list()
+        for field in self.ordering:
+            value = item
+            for name in field.lstrip('-').split('__'):
+                value = getattr(value, name)
+            values.append(value)
+        return values
+
+    def get_next_cursor(self):
+        if (not self.has_next) or (len(self.results) == 0):
+            return None
+        return self.encode_cursor(self.get_values(self.results[-1]))
+
+    def get_previous_cursor(self):
+        if (not self.has_previous) or (len(self.results) == 0):
+            return None
+        return self.encode_cursor(self.get_values(self.results[0]), reverse=True)
 
 
 class HelperPaginator:
 
-    def __init__(self, request, queryset, max_page):
-        self.paginator = Paginator(queryset, max_page)
+    def __init__(self, request, queryset, max_page, count_strategy=HelperPaginatorValue.COUNT_EXACT):
         self.link = request.build_absolute_uri()
+        self.max_page = int(max_page)
+        self.keyset = self.get_keyset(request=request, queryset=queryset, max_page=max_page)
+        if self.keyset is not None:
+            # ?cursor= : seek-пагинация, COUNT только по ?count=true
+            self.counter = None
+            if request.GET.get(HelperPaginatorValue.COUNT_QUERY_PARAM, '') in ('1', 'true'):
+                self.counter = HelperPaginatorCount(queryset=queryset, strategy=count_strategy)
+            self.page_obj = self.keyset.results
+            return
+
         self.current_page_num = self.get_current_page_num(request=request)
+        # capped: считаем хотя бы до запрошенной страницы, чтобы она была доступна
+        self.counter = HelperPaginatorCount(queryset=queryset, strategy=count_strategy,
+                                            limit=self.get_page_limit(self.current_page_num, self.max_page))
+        self.paginator = HelperCountPaginator(queryset, max_page, counter=self.counter)
         self.page_obj = self.get_page()
 
+    @staticmethod
+    def get_keyset(request, queryset, max_page):
+        cursor = request.GET.get(HelperPaginatorValue.CURSOR_QUERY_PARAM, None)
+        if cursor is None:
+            return None
+        ordering = HelperKeysetPaginator.get_ordering(queryset)
+        if ordering is None:
+            return None
+        return HelperKeysetPaginator(queryset=queryset, max_page=max_page, ordering=ordering, cursor=cursor)
+
     @staticmethod
     def get_current_page_num(request):
         return request.GET.get('page', 1)
 
+    @staticmethod
+    def get_page_limit(page_num, max_page):
+        try:
+            return max(int(page_num), 1) * max_page
+        except (TypeError, ValueError):
+            return max_page
+
     def get_page(self):
         """Вернет страницу"""
         try:
@@ -239,14 +463,20 @@ class HelperPaginator:
 
     def get_num_pages(self):
         """Вернет количество страниц"""
-        return self.paginator.num_pages
+        if self.keyset is not None:
+            return None
+        return self.counter.get_num_pages(self.max_page)
 
     def get_count(self):
         """Количество записей"""
-        return self.paginator.count
+        if self.counter is None:
+            return None
+        return self.counter.get_count()
 
     def get_link_next_page(self):
         """Следующая страница"""
+        if self.keyset is not None:
+            return self.get_link_cursor(self.keyset.get_next_cursor())
         if not self.page_obj.has_next():
             return None
 
@@ -255,8 +485,15 @@ class HelperPaginator:
 
     def get_link_previous_page(self):
         """Предыдущая страница"""
+        if self.keyset is not None:
+            return self.get_link_cursor(self.keyset.get_previous_cursor())
         if not self.page_obj.has_previous():
             return None
 
         page_number = self.page_obj.previous_page_number()
         return replace_query_param(self.link, HelperPaginatorValue.PAGE_QUERY_PARAM, page_number)
+
+    def get_link_cursor(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.link, HelperPaginatorValue.CURSOR_QUERY_PARAM, cursor)